@@ -0,0 +1,89 @@
+"""
+Microbenchmark of decoding battlelog responses into models.
+
+    python -m bench.decode --pages 100 --repeat 5
+    python -m bench.decode --file battlelog.json
+
+Compares the json module with orjson and msgspec, when they are
+installed, both decoding to dicts (what `get_battle_log_data` returns)
+and to `Battle` models (the classes of brawlstars.models, or the
+structs of brawlstars.models.structs). The payloads are the mock api's
+battle logs unless `--file` gives a saved response of the real api:
+
+    curl -H "Authorization: Bearer $KEY" \\
+        https://api.brawlstars.com/v1/players/%23TAG/battlelog > battlelog.json
+"""
+
+import argparse
+import json
+from time import perf_counter
+from brawlstars import Battle, codec
+from bench.mock_api import MockBrawlStarsAPI
+
+
+def paths() -> dict:
+    """name -> function decoding a battlelog body"""
+    paths = {
+        "json, dicts": lambda body: json.loads(body)["items"],
+        "json, classes": lambda body: [Battle(i) for i in json.loads(body)["items"]],
+    }
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        paths["orjson, dicts"] = lambda body: orjson.loads(body)["items"]
+        paths["orjson, classes"] = lambda body: [
+            Battle(i) for i in orjson.loads(body)["items"]
+        ]
+    if codec.structs is not None:
+        paths["msgspec, structs"] = lambda body: codec.build_page(
+            Battle, codec.decode(body, Battle)
+        )
+    return paths
+
+
+def payloads(args) -> list[bytes]:
+    if args.file:
+        with open(args.file, "rb") as f:
+            return [f.read()]
+    api = MockBrawlStarsAPI(cl_ratio=args.cl_ratio)
+    return [
+        json.dumps(api.battle_log(f"#P{i}")).encode() for i in range(args.pages)
+    ]
+
+
+def measure(decode, bodies: list[bytes], repeat: int) -> float:
+    """best seconds to decode every body once"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        for body in bodies:
+            decode(body)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main(args):
+    bodies = payloads(args)
+    battles = sum(len(json.loads(b)["items"]) for b in bodies)
+    size = sum(map(len, bodies)) / len(bodies)
+    print(f"{len(bodies)} pages, {battles} battles, {size / 1024:.1f} KiB per page")
+    results = {name: measure(f, bodies, args.repeat) for name, f in paths().items()}
+    baseline = results["json, classes"]
+    width = max(map(len, results))
+    print(f"{'path'.ljust(width)}  {'us/page':>9}  {'us/battle':>9}  {'speedup':>7}")
+    for name, seconds in results.items():
+        print(
+            f"{name.ljust(width)}  {seconds / len(bodies) * 1e6:9.1f}  "
+            f"{seconds / battles * 1e6:9.2f}  {baseline / seconds:6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cl-ratio", type=float, default=0.4)
+    parser.add_argument("--file", help="a saved battlelog response")
+    main(parser.parse_args())
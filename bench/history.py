@@ -0,0 +1,102 @@
+"""
+Memory taken by a week of club league battles kept in memory.
+
+    python -m bench.history --clubs 10,100,300 --battles 10
+
+Every member of every club gets `--battles` club league battles from the
+mock api, with tags written like real ones, and the memory they hold is
+measured with tracemalloc as `Battle` objects (the classes and, with
+msgspec, the structs) and as a `BattleHistory`.
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+from brawlstars import Battle, codec
+from bench.mock_api import MockBrawlStarsAPI
+from history import TAG_CHARACTERS, BattleHistory
+
+
+def _tag(rng: random.Random) -> str:
+    return "#" + "".join(rng.choice(TAG_CHARACTERS[1:]) for _ in range(9))
+
+
+def week(clubs: int, members: int, battles: int, seed: int = 0):
+    """yields (playertag, battle json, tickets) for a week of club league"""
+    api = MockBrawlStarsAPI(cl_ratio=1.0)
+    rng = random.Random(seed)
+    start = 1_700_000_000
+    for _ in range(clubs * members):
+        tag = _tag(rng)
+        for i in range(battles):
+            data = api.battle(tag, start + i * 3600)
+            for team in data["battle"]["teams"]:
+                for p in team:
+                    if p["tag"] != tag:
+                        p["tag"] = _tag(rng)
+            yield tag, data, 1
+
+
+def measure(build) -> int:
+    """bytes still allocated once `build` returned, kept alive meanwhile"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def run(clubs: int, args) -> dict:
+    def battles(model):
+        return lambda: [
+            (tag, model(data), tickets)
+            for tag, data, tickets in week(clubs, args.members, args.battles)
+        ]
+
+    def history():
+        h = BattleHistory()
+        for tag, data, tickets in week(clubs, args.members, args.battles):
+            h.add(tag, Battle(data), tickets)
+        return h
+
+    count = clubs * args.members * args.battles
+    row = {"clubs": clubs, "battles": count}
+    row["classes MB"] = measure(battles(Battle)) / 2**20
+    if codec.structs is not None:
+        structs = battles(lambda data: codec.build(Battle, data))
+        row["structs MB"] = measure(structs) / 2**20
+    row["history MB"] = measure(history) / 2**20
+    row["bytes/battle"] = round(row["history MB"] * 2**20 / count)
+    return row
+
+
+def print_table(rows: list[dict]):
+    columns = list(rows[0])
+    cells = [
+        [f"{r[c]:.2f}" if isinstance(r[c], float) else str(r[c]) for c in columns]
+        for r in rows
+    ]
+    widths = [
+        max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(columns)
+    ]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--clubs",
+        type=lambda s: [int(i) for i in s.split(",")],
+        default=[10, 100],
+        help="comma separated club counts",
+    )
+    parser.add_argument("--members", type=int, default=30)
+    parser.add_argument("--battles", type=int, default=10)
+    args = parser.parse_args()
+    print_table([run(clubs, args) for clubs in args.clubs])
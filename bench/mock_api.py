@@ -0,0 +1,257 @@
+"""
+A local stand-in for https://api.brawlstars.com/v1 serving synthetic
+clubs, members and battle logs, for benchmarks and offline testing.
+
+    python -m bench.mock_api --port 8901 --latency 0.05 --rate-429 0.01
+
+Point a client at it with `client.base = "http://127.0.0.1:8901/v1"`.
+"""
+
+import argparse
+import asyncio
+import random
+from aiohttp import web
+from datetime import datetime, timezone
+from time import time
+
+# (type, result, trophyChange) of the battles found in the logs
+_CL_BATTLES = [
+    ("ranked", "victory", 4),  # regular club league, team
+    ("ranked", "draw", 3),
+    ("ranked", "lose", 2),
+    ("ranked", "victory", 3),  # regular club league, random
+    ("ranked", "lose", 1),
+    ("teamRanked", "victory", 9),  # power match, team
+    ("teamRanked", "lose", 5),
+    ("teamRanked", "victory", 7),  # power match, random
+    ("teamRanked", "lose", 3),
+]
+_OTHER_BATTLES = [
+    ("ranked", "victory", 8),
+    ("ranked", "defeat", -6),
+    ("soloRanked", "victory", 0),
+    ("friendly", "victory", 0),
+]
+_MAPS = ["Hard Rock Mine", "Gem Fort", "Hot Potato", "Center Stage", "Pinball Dreams"]
+_BRAWLERS = ["SHELLY", "COLT", "BULL", "BROCK", "RICO", "SPIKE", "BARLEY", "JESSIE"]
+
+
+def _battle_time(t: int) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y%m%dT%H%M%S.000Z")
+
+
+def _team_player(tag: str, rng: random.Random) -> dict:
+    return {
+        "tag": tag,
+        "name": tag.lstrip("#").title(),
+        "brawler": {
+            "id": 16000000 + rng.randrange(len(_BRAWLERS)),
+            "name": rng.choice(_BRAWLERS),
+            "power": rng.randint(1, 11),
+            "trophies": rng.randint(0, 1000),
+        },
+    }
+
+
+class MockBrawlStarsAPI:
+    __slots__ = (
+        "members",
+        "battles",
+        "spacing",
+        "cl_ratio",
+        "latency",
+        "jitter",
+        "rate_429",
+        "retry_after",
+        "requests",
+        "throttled",
+        "_runner",
+        "_rng",
+    )
+
+    def __init__(
+        self,
+        *,
+        members: int = 30,
+        battles: int = 25,
+        spacing: int = 180,
+        cl_ratio: float = 0.4,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 0.1,
+        seed: int = 0,
+    ) -> None:
+        """
+        Every club and player exists; their data is derived from the tag,
+        so the same tag always gets the same members and battles.
+
+        Parameters
+        ----------
+        members: `int`
+            members of every club
+        battles: `int`
+            battles in every battle log (the real api returns up to 25)
+        spacing: `int`
+            seconds between two battles of a player. Logs end at the
+            current time, so a new battle shows up every `spacing` seconds
+        cl_ratio: `float`
+            share of club league battles in the logs
+        latency: `float`
+            seconds every response is delayed by
+        jitter: `float`
+            random extra delay of up to `jitter` seconds
+        rate_429: `float`
+            share of requests answered with 429 Too Many Requests
+        retry_after: `float`
+            Retry-After header sent with the 429s
+        seed: `int`
+            seed of the latency and 429 randomness
+        """
+        self.members = members
+        self.battles = battles
+        self.spacing = spacing
+        self.cl_ratio = cl_ratio
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.requests: dict[str, int] = {}
+        self.throttled = 0
+        self._runner: web.AppRunner = None
+        self._rng = random.Random(seed)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def member_tags(self, clubtag: str) -> list[str]:
+        return [f"{clubtag}M{i}" for i in range(self.members)]
+
+    def club(self, clubtag: str) -> dict:
+        return {
+            "tag": clubtag,
+            "name": f"Club {clubtag.lstrip('#')}",
+            "description": "",
+            "trophies": 0,
+            "requiredTrophies": 0,
+            "members": [],
+            "type": "open",
+            "badgeId": 8000000,
+        }
+
+    def club_members(self, clubtag: str) -> dict:
+        return {
+            "items": [
+                {
+                    "tag": tag,
+                    "name": tag.lstrip("#").title(),
+                    "nameColor": "0xffffffff",
+                    "role": "member",
+                    "trophies": 10000,
+                    "icon": {"id": 28000000},
+                }
+                for tag in self.member_tags(clubtag)
+            ],
+            "paging": {"cursors": {}},
+        }
+
+    def battle(self, playertag: str, t: int) -> dict:
+        rng = random.Random(f"{playertag}{t}")
+        kinds = _CL_BATTLES if rng.random() < self.cl_ratio else _OTHER_BATTLES
+        battle_type, result, trophyChange = rng.choice(kinds)
+        team = [playertag] + [f"#T{rng.randrange(10**6)}" for _ in range(2)]
+        opponent = [f"#T{rng.randrange(10**6)}" for _ in range(3)]
+        battle = {
+            "mode": "gemGrab",
+            "type": battle_type,
+            "result": result,
+            "duration": rng.randint(60, 180),
+            "starPlayer": _team_player(team[0], rng),
+            "teams": [
+                [_team_player(p, rng) for p in team],
+                [_team_player(p, rng) for p in opponent],
+            ],
+        }
+        if trophyChange:
+            battle["trophyChange"] = trophyChange
+        return {
+            "battleTime": _battle_time(t),
+            "event": {"id": 15000000, "mode": "gemGrab", "map": rng.choice(_MAPS)},
+            "battle": battle,
+        }
+
+    def battle_log(self, playertag: str) -> dict:
+        # newest first, like the real api
+        newest = int(time()) // self.spacing * self.spacing
+        return {
+            "items": [
+                self.battle(playertag, newest - i * self.spacing)
+                for i in range(self.battles)
+            ],
+            "paging": {"cursors": {}},
+        }
+
+    @web.middleware
+    async def _simulate(self, request: web.Request, handler):
+        route = request.match_info.route.resource
+        name = route.canonical if route is not None else request.path
+        self.requests[name] = self.requests.get(name, 0) + 1
+        delay = self.latency + self._rng.random() * self.jitter
+        if delay:
+            await asyncio.sleep(delay)
+        if self.rate_429 and self._rng.random() < self.rate_429:
+            self.throttled += 1
+            return web.json_response(
+                {"reason": "requestThrottled"},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        return await handler(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._simulate])
+
+        def route(path, build):
+            async def handler(request: web.Request):
+                return web.json_response(build(request.match_info["tag"]))
+
+            app.router.add_get(path, handler)
+
+        route("/v1/clubs/{tag}", self.club)
+        route("/v1/clubs/{tag}/members", self.club_members)
+        route("/v1/players/{tag}/battlelog", self.battle_log)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """serves the api in the running event loop and returns its base
+        url. A free port is picked if `port` is 0."""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/v1"
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--members", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    args = parser.parse_args()
+    api = MockBrawlStarsAPI(
+        members=args.members,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+    )
+    web.run_app(api.app(), host=args.host, port=args.port)
@@ -0,0 +1,184 @@
+"""
+Load benchmark of the club league watcher against the mock api.
+
+    python -m bench.watcher --clubs 1,10,100,1000 --cycles 3 --latency 0.05
+
+For every club count, a fresh SQLite database is filled with that many
+clubs, then CL_watcher's poll cycle (the real BrawlStarsClient, pipeline,
+ClubLeagueTracker, RosterCache and TicketTracker) runs `--cycles` times. Discord is
+left out: the render stage reads and formats the club's stats like
+`update_club_stats` but doesn't send them. Reports cycle time, api
+requests per second, 429s, database calls and battles stored per cycle.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+# must be set before database.py creates its backend
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.gettempdir(), "bench.db"))
+
+import database
+from brawlstars import BrawlStarsClient, TTLCache
+from pipeline import Pipeline
+from roster import RosterCache
+from storage import Storage, SQLiteStorage
+from tickets import TicketTracker
+from tracker import BS_TIMEZONE, ClubLeagueTracker
+from watermark import Watermarks
+from bench.mock_api import MockBrawlStarsAPI
+
+
+class CountingStorage:
+    """Wraps a storage backend and counts the calls made to it."""
+
+    __slots__ = ("backend", "calls", "battles")
+
+    def __init__(self, backend: Storage) -> None:
+        self.backend = backend
+        self.calls: dict[str, int] = {}
+        self.battles = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if name == "store_logs":
+                self.battles += len(args[0])
+            return attr(*args, **kwargs)
+
+        return counted
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+async def run(clubs: int, args, workdir: str) -> list[dict]:
+    path = os.path.join(workdir, f"bench-{clubs}.db")
+    storage = CountingStorage(SQLiteStorage(path))
+    database.backend = storage
+
+    api = MockBrawlStarsAPI(
+        members=args.members,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        cl_ratio=args.cl_ratio,
+    )
+    client = BrawlStarsClient(
+        api_key=[f"bench-{i}" for i in range(args.keys)],
+        rate_limit=args.rate_limit,
+        cache=TTLCache(maxsize=4096),
+    )
+    client.base = await api.start()
+    watermarks = Watermarks(os.path.join(workdir, f"watermarks-{clubs}.json"))
+    roster = RosterCache(client, ttl=args.roster_ttl)
+    tracker = ClubLeagueTracker(watermarks, roster)
+    tickets = TicketTracker(idle_every=args.idle_every)
+
+    async def render(club: dict):
+        await roster.get(club["clubtag"])
+        roster.stats(club["clubtag"]).description
+
+    pipeline = Pipeline(
+        client,
+        roster,
+        classify=tracker.check_logs,
+        persist=tracker.persist,
+        render=render,
+        workers={"fetch": args.concurrency},
+    )
+    try:
+        for i in range(clubs):
+            tag = f"#C{i}"
+            await database.insert_club(tag, "gold")
+            await roster.reset(tag)
+
+        rows = []
+        for cycle in range(args.cycles):
+            requests, throttled = api.total_requests, api.throttled
+            storage.calls.clear()
+            storage.battles = 0
+            start = perf_counter()
+
+            tickets.new_cycle(datetime.now(tz=BS_TIMEZONE))
+            club_rows = await database.get_clubs()
+            results = await pipeline.run(
+                club_rows, member_filter=tickets.should_poll
+            )
+            watermarks.save()
+
+            elapsed = perf_counter() - start
+            requests = api.total_requests - requests
+            rows.append(
+                {
+                    "clubs": clubs,
+                    "cycle": cycle + 1,
+                    "seconds": elapsed,
+                    "requests": requests,
+                    "req/s": requests / elapsed,
+                    "429s": api.throttled - throttled,
+                    "db calls": storage.total,
+                    "battles": storage.battles,
+                    "failed": sum(isinstance(r, Exception) for r in results),
+                }
+            )
+        return rows
+    finally:
+        await client.close()
+        await api.close()
+
+
+def print_table(rows: list[dict]):
+    columns = list(rows[0])
+    cells = [
+        [f"{r[c]:.2f}" if isinstance(r[c], float) else str(r[c]) for c in columns]
+        for r in rows
+    ]
+    widths = [
+        max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(columns)
+    ]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+
+async def main(args):
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        for clubs in args.clubs:
+            print(f"running {clubs} clubs...", file=sys.stderr)
+            rows.extend(await run(clubs, args, workdir))
+    database._executor.shutdown()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--clubs",
+        type=lambda s: [int(i) for i in s.split(",")],
+        default=[1, 10, 100, 1000],
+        help="comma separated club counts",
+    )
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--members", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--cl-ratio", type=float, default=0.4)
+    parser.add_argument("--keys", type=int, default=1)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--idle-every", type=int, default=3)
+    parser.add_argument("--roster-ttl", type=float, default=1800)
+    asyncio.run(main(parser.parse_args()))
@@ -1,68 +1,158 @@
-import requests
+import json
+import os
+from aiohttp import ClientSession
 from datetime import datetime
+from typing import Optional
 
 
 class BrawlStarsKeyManager:
     """Create an api key without manually going to the web interface."""
 
     HEADER = {"Content-Type": "application/json; charset=utf-8"}
+    BASE = "https://developer.brawlstars.com/api"
 
     def __init__(self, email: str, password: str) -> None:
         self.__email = email
         self.__password = password
-        self.__ip = requests.get("https://ifconfig.me").text
-        login = self.login()
-        self.cookies = login.cookies
+        self.__ip: Optional[str] = None
+        self.session: Optional[ClientSession] = None
         self.last_key_id = None
 
-    def login(self):
+    async def _post(self, endpoint: str, payload: dict) -> tuple[int, dict]:
+        if self.session is None:
+            # the session's cookie jar keeps the login cookies
+            self.session = ClientSession(headers=self.HEADER)
+        async with self.session.post(self.BASE + endpoint, json=payload) as r:
+            return r.status, await r.json(content_type=None)
+
+    async def get_ip(self) -> str:
+        """Returns the public ip that keys have to be created for."""
+        if self.__ip is None:
+            async with ClientSession() as session:
+                async with session.get("https://ifconfig.me/ip") as r:
+                    self.__ip = (await r.text()).strip()
+        return self.__ip
+
+    async def login(self):
         """Logins to https://developer.brawlstars.com/api/login with
         given email and password to activate a session. This is required
         because we need the cookies/session to create an api key.
         """
-        r = requests.post(
-            "https://developer.brawlstars.com/api/login",
-            json={"email": self.__email, "password": self.__password},
-            headers=self.HEADER,
+        status, data = await self._post(
+            "/login", {"email": self.__email, "password": self.__password}
         )
-        if r.status_code == 403:
+        if status == 403:
             raise ValueError(
-                f'{r.json()["description"]} Register first '
+                f'{data["description"]} Register first '
                 "to https://developer.brawlstars.com if you haven't already."
             )
-        return r
+        return data
 
-    def create_key(self, additional_ips=[], delete_last=True) -> str:
+    async def create_key(
+        self, additional_ips=[], delete_last=True, name: str = "key"
+    ) -> str:
         """Creates an api key with current ip. Add additional ips
         of your own if you want. Calling this function with `delete_last`
         as true will delete its last created key."""
 
         if self.last_key_id and delete_last:
-            self.delete_key()
+            await self.delete_key()
         if len(additional_ips) > 4:
             raise ValueError(
                 "You can only add up to 5 ips"
                 "due to the limitations imposed by"
                 "the api."
             )
-        r = requests.post(
-            "https://developer.brawlstars.com/api/apikey/create",
-            json={
-                "name": "key",
+        _, resp = await self._post(
+            "/apikey/create",
+            {
+                "name": name,
                 "description": f"auto-generated by BrawlStarsClient on "
                 f"{datetime.utcnow().isoformat(timespec='seconds')}",
-                "cidrRanges": [self.__ip] + additional_ips,
+                "cidrRanges": [await self.get_ip()] + additional_ips,
                 "scopes": None,
             },
-            headers=self.HEADER,
-            cookies=self.cookies,
         )
-        resp = r.json()
         self.last_key_id = resp["key"]["id"]
         self.apikey = resp["key"]["key"]
         return self.apikey
 
-    def delete_key(self, id=None):
+    async def create_keys(
+        self, count: int, additional_ips=[], name: str = "key"
+    ) -> list[str]:
+        """Creates `count` api keys named `name` with current ip. Keys
+        auto-generated by BrawlStarsClient earlier with the same name are
+        deleted, oldest first, when the account would otherwise go over
+        its limit of 10 keys. Keys with other names may be in use by
+        other processes and are never deleted: if deleting ours isn't
+        enough, a ValueError is raised instead."""
+        if not 0 < count <= 10:
+            raise ValueError("You can only have 1 to 10 keys per account.")
+        keys = await self.list_key()
+        excess = len(keys) + count - 10
+        if excess > 0:
+            # the description ends with the creation time, so sorting
+            # by it puts the oldest first
+            ours = sorted(
+                (
+                    k
+                    for k in keys
+                    if k.get("name") == name
+                    and k.get("description", "").startswith(
+                        "auto-generated by BrawlStarsClient"
+                    )
+                ),
+                key=lambda k: k["description"],
+            )
+            if len(ours) < excess:
+                raise ValueError(
+                    f"creating {count} keys would go over the limit of 10 keys, "
+                    f"the account has {len(keys)} and only {len(ours)} "
+                    f"are named {name!r}"
+                )
+            for k in ours[:excess]:
+                await self.delete_key(id=k["id"])
+        return [
+            await self.create_key(additional_ips, delete_last=False, name=name)
+            for _ in range(count)
+        ]
+
+    async def get_keys(
+        self,
+        count: int,
+        cache_path: Optional[str] = None,
+        name: str = "key",
+        *,
+        use_cache: bool = True,
+    ) -> list[str]:
+        """Returns `count` api keys for the current ip, created with
+        `name`. Keys cached at `cache_path` are reused as long as the ip
+        hasn't changed, so restarts don't need to log in or create new
+        keys. With `use_cache` False the ip is looked up again and new
+        keys are created and cached regardless, e.g. because the cached
+        ones were revoked or the ip changed."""
+        if not use_cache:
+            self.__ip = None
+        ip = await self.get_ip()
+        if cache_path is not None and use_cache:
+            try:
+                with open(cache_path, encoding="utf8") as f:
+                    cache = json.load(f)
+            except (FileNotFoundError, ValueError):
+                cache = {}
+            if cache.get("ip") == ip and len(cache.get("keys", [])) >= count:
+                return cache["keys"][:count]
+
+        await self.login()
+        keys = await self.create_keys(count, name=name)
+        if cache_path is not None:
+            # the file holds secrets, keep it private
+            fd = os.open(cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w", encoding="utf8") as f:
+                json.dump({"ip": ip, "keys": keys}, f)
+        return keys
+
+    async def delete_key(self, id=None):
         """Deletes the last created apikey unless id is specified"""
         if id is None:
             if self.last_key_id is None:
@@ -70,27 +160,21 @@ class BrawlStarsKeyManager:
             id = self.last_key_id
             self.last_key_id = None
 
-        r = requests.post(
-            "https://developer.brawlstars.com/api/apikey/revoke",
-            json={"id": id},
-            headers=self.HEADER,
-            cookies=self.cookies,
-        )
-        return r.status_code
+        status, _ = await self._post("/apikey/revoke", {"id": id})
+        return status
 
-    def list_key(self):
+    async def list_key(self):
         """Retrieves all keys that you own along with their information."""
-        r = requests.post(
-            "https://developer.brawlstars.com/api/apikey/list",
-            json={},
-            headers=self.HEADER,
-            cookies=self.cookies,
-        )
-        keys = r.json()["keys"]
-        return keys
+        _, data = await self._post("/apikey/list", {})
+        return data["keys"]
 
-    def delete_all_keys(self):
-        keys = self.list_key()
+    async def delete_all_keys(self):
+        keys = await self.list_key()
         for i in keys:
-            self.delete_key(id=i["id"])
+            await self.delete_key(id=i["id"])
         return
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
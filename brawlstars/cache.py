@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from time import time
+from typing import Any, Optional
+
+MISSING = object()
+
+DEFAULT_TTL = {
+    "player": 60,
+    "club": 300,
+    "club_members": 300,
+    "brawler": 86400,
+    # fallback only, rotation entries expire at their endTime
+    "event_rotation": 3600,
+}
+
+
+class TTLCache:
+    """An in-process LRU cache whose entries expire after
+    a time-to-live that depends on the endpoint.
+
+    Attributes
+    ----------
+    maxsize: `int`
+        maximum number of entries before the least
+        recently used one is evicted
+    ttl: `dict[str, float]`
+        seconds an entry of each endpoint stays fresh.
+        Endpoints missing from it are not cached
+    hits: `int`
+        number of lookups answered from the cache
+    misses: `int`
+        number of lookups that were not
+    """
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "_data")
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: Optional[dict[str, float]] = None
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = DEFAULT_TTL | (ttl or {})
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any:
+        """Returns the fresh value stored at `key` or `MISSING`."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(
+        self, endpoint: str, key: str, value: Any, *, expires: Optional[float] = None
+    ) -> None:
+        """Stores `value` at `key` until `expires` (a unix timestamp),
+        or for the ttl of `endpoint` if it is not given."""
+        if expires is None:
+            ttl = self.ttl.get(endpoint)
+            if not ttl:
+                return
+            expires = time() + ttl
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
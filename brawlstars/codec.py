@@ -0,0 +1,69 @@
+"""
+Decoding of api responses. Bodies are parsed with orjson when it is
+installed, and with msgspec the models requested the most are decoded
+straight into the structs of `models.structs`, skipping the dicts and
+the python `__init__`s. Without them, the json module and the classes
+of `models` are used.
+"""
+from .models.battle import Battle
+from .models.club import Club, ClubMember
+from .models.player import Player
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+try:
+    from msgspec import ValidationError, convert
+    from msgspec.json import Decoder
+    from .models import structs
+except ImportError:
+    structs = None
+
+if structs is not None:
+    STRUCTS = {
+        Battle: structs.Battle,
+        Player: structs.Player,
+        Club: structs.Club,
+        ClubMember: structs.ClubMember,
+    }
+    # responses holding each model, paged for battles and club members
+    _DECODERS = {
+        Battle: Decoder(structs.BattleLog),
+        Player: Decoder(structs.Player),
+        Club: Decoder(structs.Club),
+        ClubMember: Decoder(structs.ClubMembers),
+    }
+
+
+def decode(body: bytes, model: type = None):
+    """decodes a response body into the struct of `model`
+    (a page of them for `Battle` and `ClubMember`) if msgspec
+    is installed, into its json otherwise"""
+    if model is not None and structs is not None:
+        try:
+            return _DECODERS[model].decode(body)
+        except ValidationError:
+            # not shaped like the struct, the class will handle it
+            pass
+    return loads(body)
+
+
+def build(model: type, data):
+    """`model` made from its json, unless `decode` already did"""
+    if not isinstance(data, dict):
+        return data
+    if structs is not None:
+        try:
+            return convert(data, STRUCTS[model])
+        except ValidationError:
+            pass
+    return model(data)
+
+
+def build_page(model: type, data) -> list:
+    """the `model`s of a paged response"""
+    if isinstance(data, dict):
+        return [build(model, i) for i in data["items"]]
+    return data.items
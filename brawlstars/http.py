@@ -13,59 +13,248 @@ from .models.errors import (
     BrawlStarsServerError,
 )
 from .api_key_manager import BrawlStarsKeyManager
-from asyncio import sleep, get_event_loop
-from typing import AsyncGenerator, Optional
+from .ratelimit import backoff, parse_retry_after
+from .keys import KeyPool
+from .cache import TTLCache, MISSING
+from . import codec
+from .models.utils import parse_battleTime
+from asyncio import sleep, ensure_future, wait, Future
+from time import monotonic
+from typing import AsyncGenerator, Callable, Optional
 
 
 class BrawlStarsClient:
-    __slots__ = ("api_key", "base", "session", "__api_key_manager")
+    __slots__ = (
+        "keys",
+        "base",
+        "session",
+        "max_retries",
+        "cache",
+        "on_request",
+        "_key_options",
+        "_starting",
+        "_renewing",
+        "__api_key_manager",
+    )
 
     def __init__(
         self,
         *,
-        api_key: Optional[str] = None,
+        api_key: Optional[str | list[str]] = None,
         email: Optional[str] = None,
         password: Optional[str] = None,
+        key_count: int = 1,
+        key_cache: Optional[str] = None,
+        key_name: str = "key",
+        rate_limit: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_retries: int = 3,
+        cache: Optional[TTLCache] = None,
+        on_request: Optional[Callable[[str, Optional[int], float], None]] = None,
     ) -> None:
+        """
+        Parameters
+        ----------
+        api_key: `str | list[str]`
+            api key(s) from https://developer.brawlstars.com/.
+            Requests are spread across every key given
+        email, password: `str`
+            credentials used to create api keys instead
+        key_count: `int`
+            how many keys to create with email and password (max 10)
+        key_cache: `str`
+            file the created keys and their ip are saved to, so they
+            are reused on the next start if the ip hasn't changed
+        key_name: `str`
+            name the keys are created with. Only keys created earlier
+            with this name are deleted to stay within the account's
+            limit of 10, so processes sharing an account need their own
+        rate_limit: `float`
+            requests per second allowed for each api key.
+            No client-side limit is applied if None (default)
+        burst: `float`
+            how many requests may be sent at once before
+            `rate_limit` kicks in. Defaults to `rate_limit`
+        max_retries: `int`
+            how many times a request is retried after
+            a 429 or 503 response before giving up
+        cache: `TTLCache`
+            cache for player, club, club member, brawler
+            and event rotation responses. Disabled if None (default)
+        on_request: `Callable[[str, int | None, float], None]`
+            called after every attempt of a request with the endpoint,
+            the response status (None if no response came) and the
+            seconds it took, e.g. to collect metrics
+        """
         if api_key is None and (email is None or password is None):
             raise ValueError(
                 "Specify either an api_key or"
                 "an email and password for logging in"
                 "to https://developer.brawlstars.com/"
             )
+        # nothing is sent until `start`, keys from email and
+        # password are fetched there without blocking the event loop
+        self.__api_key_manager = None
+        self.keys: KeyPool = None
         if api_key:
-            self.api_key = api_key
+            keys = [api_key] if isinstance(api_key, str) else list(api_key)
+            self.keys = KeyPool(keys, rate_limit=rate_limit, burst=burst)
         else:
             self.__api_key_manager = BrawlStarsKeyManager(email, password)
-            self.api_key = self.__api_key_manager.create_key()
+        self._key_options = (key_count, key_cache, key_name, rate_limit, burst)
 
         self.base = "https://api.brawlstars.com/v1"
+        self.max_retries = max_retries
+        self.cache = cache
+        self.on_request = on_request
+        self.session: ClientSession = None
+        self._starting: Future = None
+        self._renewing: Future = None
 
-        self.session: ClientSession = get_event_loop().run_until_complete(
-            self.__start()
-        )
+    async def start(self):
+        """Creates the http session and, when logging in with an email
+        and password, gets the api keys. Safe to call more than once;
+        requests call it themselves if it wasn't awaited yet."""
+        if self._starting is None:
+            self._starting = ensure_future(self.__start())
+        try:
+            await self._starting
+        except Exception:
+            self._starting = None
+            raise
 
     async def __start(self):
-        return ClientSession(headers={"Authorization": "Bearer " + self.api_key})
+        if self.keys is None:
+            count, cache_path, name, rate_limit, burst = self._key_options
+            try:
+                keys = await self.__api_key_manager.get_keys(count, cache_path, name)
+            finally:
+                await self.__api_key_manager.close()
+            self.keys = KeyPool(keys, rate_limit=rate_limit, burst=burst)
+        # the authorization header is set per request by the key pool
+        self.session = ClientSession()
+
+    async def __renew_keys(self):
+        count, cache_path, name, rate_limit, burst = self._key_options
+        print("every api key was rejected, creating new ones")
+        try:
+            keys = await self.__api_key_manager.get_keys(
+                count, cache_path, name, use_cache=False
+            )
+        finally:
+            await self.__api_key_manager.close()
+        self.keys = KeyPool(keys, rate_limit=rate_limit, burst=burst)
+
+    async def _renew_keys(self) -> bool:
+        """Replaces the keys once all of them were rejected, e.g. because
+        the cached keys were revoked. Only done once, and only when
+        logging in with an email and password. Returns whether there
+        are usable keys afterwards."""
+        if self.__api_key_manager is None:
+            return False
+        if self._renewing is None:
+            self._renewing = ensure_future(self.__renew_keys())
+        try:
+            await self._renewing
+        except Exception as e:
+            print(f"could not create new api keys: {e!r}")
+            return False
+        return bool(self.keys.active())
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self._starting = None
 
-    async def _request(self, url) -> dict | None:
+    async def _request(
+        self, url: str, endpoint: str, model: Optional[type] = None
+    ) -> dict | None:
         if self.session is None:
-            raise RuntimeError("session was not set; run client.start() first")
-        async with self.session.get(url) as resp:
-            data = await resp.json()
+            await self.start()
+        for attempt in range(self.max_retries + 1):
+            if self._renewing is not None and not self._renewing.done():
+                # the keys are being replaced, don't take a rejected one
+                await wait([self._renewing])
+            key = await self.keys.acquire()
+            start = monotonic()
+            status = None
+            try:
+                async with self.session.get(url, headers=key.headers) as resp:
+                    status = resp.status
+                    body = await resp.read()
+                data = None
+                if body and status == 200:
+                    data = codec.decode(body, model)
+                elif body:
+                    # errors may not be json, e.g. a gateway's html page,
+                    # that must not keep a 429 or 503 from being retried
+                    try:
+                        data = codec.decode(body)
+                    except ValueError:
+                        data = body.decode(errors="replace")
+            except Exception:
+                if self.on_request is not None:
+                    self.on_request(endpoint, status, monotonic() - start)
+                raise
+            if self.on_request is not None:
+                self.on_request(endpoint, resp.status, monotonic() - start)
+
             match resp.status:
                 case 200:
                     return data
                 case 400:
                     raise BadRequest(resp.status, data)
                 case 403:
-                    raise Forbidden(resp.status, data)
+                    # invalid key or ip, retry with another key
+                    self.keys.disable(key)
+                    if not self.keys.active() and not await self._renew_keys():
+                        raise Forbidden(resp.status, data)
+                    if attempt == self.max_retries:
+                        raise Forbidden(resp.status, data)
+                    continue
                 case 404:
                     raise NotFound(resp.status, data)
+                case 429 | 503 if attempt < self.max_retries:
+                    retry_after = parse_retry_after(resp.headers.get("Retry-After"))
                 case 429:
                     raise TooManyRequests(resp.status, data)
                 case 500 | 503:
                     raise BrawlStarsServerError(resp.status, data)
+                case _:
+                    return None
+
+            if retry_after is None:
+                delay = backoff(attempt)
+            else:
+                # jitter so concurrent requests don't all retry at once
+                delay = retry_after + backoff(0)
+            if resp.status == 429 and key.bucket is not None:
+                # the whole key is throttled, not just this request
+                key.bucket.drain(delay)
+            await sleep(delay)
+
+    async def _cached_request(
+        self, endpoint: str, url: str, model: Optional[type] = None
+    ) -> dict | None:
+        if self.cache is None:
+            return await self._request(url, endpoint, model)
+        data = self.cache.get(url)
+        if data is MISSING:
+            data = await self._request(url, endpoint, model)
+            if data is not None:
+                self.cache.set(
+                    endpoint, url, data, expires=self._expires(endpoint, data)
+                )
+        return data
+
+    @staticmethod
+    def _expires(endpoint: str, data) -> Optional[float]:
+        if endpoint != "event_rotation" or not data:
+            return None
+        # the rotation is stale as soon as its first event ends
+        events = data if isinstance(data, list) else [data]
+        return min(parse_battleTime(e["endTime"]).timestamp() for e in events)
 
     async def get_player(self, playerTag: str) -> Player:
         """Get information about a single player
@@ -79,8 +268,8 @@ class BrawlStarsClient:
 
         """
         url = "{0}/players/{1}".format(self.base, quote(playerTag))
-        data = await self._request(url)
-        return Player(data)
+        data = await self._cached_request("player", url, Player)
+        return codec.build(Player, data)
 
     async def get_club(self, clubTag: str) -> Club:
         """Get information about a single clan by club tag.
@@ -92,8 +281,8 @@ class BrawlStarsClient:
             Tag of the club.
         """
         url = "{0}/clubs/{1}".format(self.base, quote(clubTag))
-        data = await self._request(url)
-        return Club(data)
+        data = await self._cached_request("club", url, Club)
+        return codec.build(Club, data)
 
     async def get_club_members(
         self, clubTag: str, **kwargs
@@ -122,11 +311,12 @@ class BrawlStarsClient:
         if limit:
             url += f"?limit={limit}"
 
-        data = await self._request(url)
+        data = await self._cached_request("club_members", url, ClubMember)
+        members = codec.build_page(ClubMember, data)
 
         async def clubmembers():
-            for i in data["items"]:
-                yield ClubMember(i)
+            for i in members:
+                yield i
                 await sleep(0)
 
         return clubmembers()
@@ -134,8 +324,8 @@ class BrawlStarsClient:
     async def get_battle_log(
         self, playerTag: str, *, sort: int = 1
     ) -> AsyncGenerator[Battle, None]:
-        """Get list of recent battle results for a player. 
-        NOTE: It may take up to 30 minutes for a new battle 
+        """Get list of recent battle results for a player.
+        NOTE: It may take up to 30 minutes for a new battle
         to appear in the battlelog.
 
         Parameters
@@ -148,15 +338,30 @@ class BrawlStarsClient:
         if sort not in (-1, 1):
             raise ValueError("sort is not -1 or 1")
         url = "{0}/players/{1}/battlelog".format(self.base, quote(playerTag))
-        data = await self._request(url)
+        data = await self._request(url, "battlelog", Battle)
+        items = codec.build_page(Battle, data)
 
         async def battlelogs():
-            for i in data["items"][::sort]:
-                yield Battle(i)
+            for i in items[::sort]:
+                yield i
                 await sleep(0)
 
         return battlelogs()
 
+    async def get_battle_log_data(self, playerTag: str) -> list[dict]:
+        """Same as `get_battle_log` but returns the battles as the
+        raw json dicts, newest first, without building `Battle` objects.
+        Lets callers skip the entries they don't need cheaply.
+
+        Parameters
+        ----------
+        playerTag: `int`
+            Tag of the player.
+        """
+        url = "{0}/players/{1}/battlelog".format(self.base, quote(playerTag))
+        data = await self._request(url, "battlelog")
+        return data["items"]
+
     async def get_brawler(self, brawlerId: int):
         """Get information about a brawler.
 
@@ -166,14 +371,14 @@ class BrawlStarsClient:
             Identifier of the brawler.
         """
         url = "{0}/brawlers/{1}".format(self.base, quote(str(brawlerId)))
-        data = await self._request(url)
+        data = await self._cached_request("brawler", url)
         return Brawler(data)
 
     async def get_event_rotation(self, /):
         # XXX should return list
         """Get event rotation for ongoing events."""
         url = "{0}/events/rotation".format(self.base)
-        data = await self._request(url)
+        data = await self._cached_request("event_rotation", url)
         return ScheduledEvent(data)
 
     async def player_is_club_member(self, playertag: str, clubtag: str):
@@ -0,0 +1,91 @@
+from typing import Optional
+from .ratelimit import TokenBucket
+
+
+class APIKey:
+    """An api key and its own rate accounting.
+
+    Attributes
+    ----------
+    key: `str`
+        the api key
+    bucket: `TokenBucket`
+        the key's requests-per-second budget, None if unlimited
+    requests: `int`
+        number of requests sent with this key
+    disabled: `bool`
+        whether the key was taken out of rotation after a 403
+    """
+
+    __slots__ = ("key", "bucket", "requests", "disabled", "headers")
+
+    def __init__(self, key: str, bucket: Optional[TokenBucket] = None) -> None:
+        self.key = key
+        self.bucket = bucket
+        self.requests = 0
+        self.disabled = False
+        self.headers = {"Authorization": "Bearer " + key}
+
+    def __repr__(self) -> str:
+        return "APIKey(key={}..., requests={}, disabled={})".format(
+            self.key[:8], self.requests, self.disabled
+        )
+
+
+class KeyPool:
+    __slots__ = ("keys", "_index")
+
+    def __init__(
+        self,
+        keys: list[str],
+        *,
+        rate_limit: Optional[float] = None,
+        burst: Optional[float] = None,
+    ) -> None:
+        """
+        Spreads requests across several api keys in round-robin order.
+
+        Parameters
+        ----------
+        keys: `list[str]`
+            the api keys
+        rate_limit: `float`
+            requests per second allowed for each key.
+            No client-side limit is applied if None (default)
+        burst: `float`
+            how many requests each key may send at once
+        """
+        if not keys:
+            raise ValueError("at least one api key is required")
+        self.keys = [
+            APIKey(k, TokenBucket(rate_limit, burst) if rate_limit else None)
+            for k in keys
+        ]
+        self._index = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def active(self) -> list[APIKey]:
+        return [k for k in self.keys if not k.disabled]
+
+    def next(self) -> APIKey:
+        """returns the next key in rotation"""
+        for _ in range(len(self.keys)):
+            key = self.keys[self._index]
+            self._index = (self._index + 1) % len(self.keys)
+            if not key.disabled:
+                return key
+        raise RuntimeError("every api key was rejected by the api")
+
+    async def acquire(self) -> APIKey:
+        """returns the next key once its rate limit allows a request"""
+        key = self.next()
+        if key.bucket is not None:
+            await key.bucket.acquire()
+        key.requests += 1
+        return key
+
+    def disable(self, key: APIKey):
+        """takes `key` out of rotation"""
+        key.disabled = True
@@ -0,0 +1,160 @@
+"""
+msgspec versions of the models the tracker requests the most, decoded
+straight from the response body. They have the attributes and methods
+of the classes in this package, which are used when msgspec is missing.
+"""
+from typing import Optional
+from msgspec import Struct, field
+from . import battle as _battle, player as _player
+from .utils import parse_battleTime
+
+# gc=False: the models hold no reference cycles, so the garbage
+# collector doesn't need to track the thousands built every cycle
+
+
+class BrawlerInfo(Struct, gc=False):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    power: Optional[int] = None
+    trophies: Optional[int] = None
+
+
+class TeamPlayer(Struct, gc=False):
+    tag: Optional[str] = None
+    name: Optional[str] = None
+    brawler: BrawlerInfo = field(default_factory=BrawlerInfo)
+
+
+class Event(Struct, gc=False):
+    id: Optional[int] = None
+    mode: Optional[str] = None
+    map: Optional[str] = None
+
+
+class BattleResult(Struct, gc=False):
+    mode: Optional[str] = None
+    type: str = "Event"
+    result: Optional[str] = None
+    duration: Optional[int] = None
+    starPlayer: Optional[TeamPlayer] = None
+    players: list[TeamPlayer] = []
+    teams: list[list[TeamPlayer]] = []
+    trophyChange: int = 0
+
+    is_friendly = _battle.BattleResult.is_friendly
+    is_regular_CL_team = _battle.BattleResult.is_regular_CL_team
+    is_regular_CL_random = _battle.BattleResult.is_regular_CL_random
+    is_power_match_CL_team = _battle.BattleResult.is_power_match_CL_team
+    is_power_match_CL_random = _battle.BattleResult.is_power_match_CL_random
+    is_power_league_team = _battle.BattleResult.is_power_league_team
+    is_power_league_solo = _battle.BattleResult.is_power_league_solo
+
+
+class Battle(Struct, gc=False):
+    # an aware datetime (UTC) once decoded, like `Battle.battleTime`
+    battleTime: str
+    event: Event = field(default_factory=Event)
+    battle: BattleResult = field(default_factory=BattleResult)
+
+    def __post_init__(self):
+        self.battleTime = parse_battleTime(self.battleTime)
+
+    trophyChange = _battle.Battle.trophyChange
+    teams = _battle.Battle.teams
+    players = _battle.Battle.players
+    result = _battle.Battle.result
+    type = _battle.Battle.type
+
+    is_friendly = _battle.Battle.is_friendly
+    is_regular_CL_team = _battle.Battle.is_regular_CL_team
+    is_regular_CL_random = _battle.Battle.is_regular_CL_random
+    is_power_match_CL_team = _battle.Battle.is_power_match_CL_team
+    is_power_match_CL_random = _battle.Battle.is_power_match_CL_random
+    is_power_league = _battle.Battle.is_power_league
+
+
+class BattleLog(Struct, gc=False):
+    items: list[Battle] = []
+
+
+class PlayerClub(Struct, gc=False):
+    tag: Optional[str] = None
+    name: Optional[str] = None
+
+
+class PlayerIcon(Struct, gc=False):
+    id: Optional[int] = None
+
+
+class Gear(Struct, gc=False):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    level: Optional[int] = None
+
+
+class StarPower(Struct, gc=False):
+    id: Optional[int] = None
+    name: Optional[str] = None
+
+
+Gadget = StarPower
+
+
+class BrawlerStat(Struct, gc=False):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    starPowers: tuple[StarPower, ...] = ()
+    gadgets: tuple[Gadget, ...] = ()
+    rank: Optional[int] = None
+    trophies: Optional[int] = None
+    highestTrophies: Optional[int] = None
+    power: Optional[int] = None
+    gears: list[Gear] = []
+
+
+class Player(Struct, gc=False):
+    tag: Optional[str] = None
+    name: Optional[str] = None
+    club: PlayerClub = field(default_factory=PlayerClub)
+    isQualifiedFromChampionshipChallenge: Optional[bool] = None
+    _3vs3Victories: Optional[int] = field(name="3vs3Victories", default=None)
+    icon: PlayerIcon = field(default_factory=PlayerIcon)
+    trophies: Optional[int] = None
+    expLevel: Optional[int] = None
+    expPoints: Optional[int] = None
+    highestTrophies: Optional[int] = None
+    powerPlayPoints: Optional[int] = None
+    highestPowerPlayPoints: Optional[int] = None
+    soloVictories: Optional[int] = None
+    duoVictories: Optional[int] = None
+    bestRoboRumbleTime: Optional[int] = None
+    bestTimeAsBigBrawler: Optional[int] = None
+    brawlers: list[BrawlerStat] = []
+    nameColor: Optional[str] = None
+
+    is_club_member = _player.Player.is_club_member
+
+
+class Club(Struct, gc=False):
+    tag: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    trophies: Optional[int] = None
+    requiredTrophies: Optional[int] = None
+    # the raw member dicts, like `Club.members`
+    members: Optional[list] = None
+    type: Optional[str] = None
+    badgeId: Optional[int] = None
+
+
+class ClubMember(Struct, gc=False):
+    tag: Optional[str] = None
+    name: Optional[str] = None
+    icon: Optional[dict] = None
+    trophies: Optional[int] = None
+    role: Optional[str] = None
+    nameColor: Optional[str] = None
+
+
+class ClubMembers(Struct, gc=False):
+    items: list[ClubMember] = []
@@ -9,6 +9,12 @@ class Base:
 
 
 
+def format_battleTime(dt: datetime) -> str:
+    """format an aware datetime the way battleTime is, so both
+    can be compared as strings: YYYYMMDDTHHMMSS.000Z (UTC)"""
+    return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%S.000Z")
+
+
 def parse_battleTime(battleTime: str):
     """parse battleTime from ISO-format to aware datetime object (UTC)
     battleTime format: YYYYMMDDTHHMMSS.000Z"""
@@ -0,0 +1,63 @@
+from asyncio import sleep
+from random import uniform
+from time import monotonic
+from typing import Optional
+
+
+class TokenBucket:
+    """A token bucket that limits how many requests
+    may be sent per second.
+
+    Attributes
+    ----------
+    rate: `float`
+        tokens added per second (the requests-per-second budget)
+    capacity: `float`
+        maximum number of tokens, i.e. the largest allowed burst
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_last")
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._last = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        """Waits until a token is available and consumes it."""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await sleep((1 - self._tokens) / self.rate)
+
+    def drain(self, seconds: float):
+        """Stops handing out tokens for the next `seconds`,
+        e.g. when the server tells us to back off."""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+def backoff(attempt: int, *, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for the given attempt (0-indexed)."""
+    return uniform(0, min(cap, base * 2**attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Returns the seconds from a Retry-After header, if it holds any."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        # the HTTP-date form is not used by the Brawl Stars API
+        return None
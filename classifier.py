@@ -0,0 +1,111 @@
+from enum import Enum
+from typing import Iterable, NamedTuple, Optional
+from brawlstars import Battle
+
+# matches any value of its field
+ANY = None
+
+
+class MatchKind(str, Enum):
+    regular_team = "regular_team"
+    regular_random = "regular_random"
+    power_match_team = "power_match_team"
+    power_match_random = "power_match_random"
+
+
+class Rule(NamedTuple):
+    type: Optional[str]
+    result: Optional[str]
+    trophyChange: Optional[int]
+    duration: Optional[bool]
+    kind: MatchKind
+    tickets: int
+
+
+# The club league battles and the tickets they cost, first match wins.
+# Regular matches are recognised by the trophies they give for each
+# result, power matches by the trophies of a teamRanked battle.
+CL_RULES = (
+    Rule(ANY, "victory", 4, True, MatchKind.regular_team, 1),
+    Rule(ANY, "draw", 3, True, MatchKind.regular_team, 1),
+    Rule(ANY, "lose", 2, True, MatchKind.regular_team, 1),
+    Rule(ANY, "victory", 3, True, MatchKind.regular_random, 1),
+    Rule(ANY, "draw", 2, True, MatchKind.regular_random, 1),
+    Rule(ANY, "lose", 1, True, MatchKind.regular_random, 1),
+    Rule("teamRanked", ANY, 5, ANY, MatchKind.power_match_team, 2),
+    Rule("teamRanked", ANY, 9, ANY, MatchKind.power_match_team, 2),
+    Rule("teamRanked", ANY, 3, ANY, MatchKind.power_match_random, 2),
+    Rule("teamRanked", ANY, 7, ANY, MatchKind.power_match_random, 2),
+)
+
+
+class BattleClassifier:
+    __slots__ = ("rules", "_table", "_types", "_trophies", "_pairs")
+
+    def __init__(self, rules: Iterable[Rule] = CL_RULES) -> None:
+        """
+        Tells club league battles apart with a lookup table keyed on
+        (type, result, trophyChange, duration present).
+
+        The table is filled from `rules` the first time a key is seen,
+        so every later battle with the same key is a single dict lookup.
+
+        Parameters
+        ----------
+        rules: `Iterable[Rule]`
+            rules tried in order, ANY fields match every value
+        """
+        self.rules = tuple(rules)
+        self._table: dict[tuple, Optional[Rule]] = {}
+        # what `may_match` needs from the rules: types matching
+        # any trophyChange, trophyChanges matching any type and
+        # the (type, trophyChange) of the other rules
+        self._types = {r.type for r in self.rules if r.trophyChange is ANY}
+        self._trophies = {r.trophyChange for r in self.rules if r.type is ANY}
+        self._pairs = {(r.type, r.trophyChange) for r in self.rules}
+
+    @staticmethod
+    def key(battle: Battle) -> tuple:
+        b = battle.battle
+        return (b.type, b.result, b.trophyChange, b.duration is not None)
+
+    def _match(self, key: tuple) -> Optional[Rule]:
+        for rule in self.rules:
+            if all(want is ANY or want == value for want, value in zip(rule[:4], key)):
+                return rule
+        return None
+
+    def lookup(self, key: tuple) -> Optional[Rule]:
+        try:
+            return self._table[key]
+        except KeyError:
+            rule = self._table[key] = self._match(key)
+            return rule
+
+    def may_match(self, entry: dict) -> bool:
+        """False if a raw battle log entry can't be a club league
+        battle, judging only from its type and trophyChange. Used to
+        skip entries before building their `Battle`"""
+        battle = entry.get("battle", {})
+        type, trophyChange = battle.get("type", "Event"), battle.get("trophyChange", 0)
+        return (
+            ANY in self._types
+            or type in self._types
+            or ANY in self._trophies
+            or trophyChange in self._trophies
+            or (type, trophyChange) in self._pairs
+        )
+
+    def classify(self, battle: Battle) -> Optional[Rule]:
+        """returns the rule `battle` matches, None if
+        it isn't a club league battle"""
+        return self.lookup(self.key(battle))
+
+    def classify_page(self, battles: Iterable[Battle]) -> list[tuple[Battle, Rule]]:
+        """returns (battle, rule) of every club league battle in `battles`"""
+        lookup, key = self.lookup, self.key
+        return [
+            (battle, rule)
+            for battle in battles
+            if (rule := lookup(key(battle))) is not None
+        ]
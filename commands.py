@@ -142,7 +142,7 @@ class MyCog(commands.Cog):
         during the last(current) club league week."""
         await inter.response.defer()
         try:
-            logs = get_member_log(membertag)
+            logs = await get_member_log(membertag)
         except Exception as e:
             await inter.followup.send(*e.args)
             raise e
@@ -182,17 +182,17 @@ class MyCog(commands.Cog):
             return await inter.followup.send(*e.args)
 
         # check database
-        if not check_if_exists(clubtag, "clubs", "clubtag"):
-            insert_club(clubtag, ClubRank(rank).name)
+        if not await check_if_exists(clubtag, "clubs", "clubtag"):
+            await insert_club(clubtag, ClubRank(rank).name)
 
-        if check_if_exists(inter.guild_id, "discord", "serverid"):
+        if await check_if_exists(inter.guild_id, "discord", "serverid"):
             return await inter.followup.send(
                 f"Logs for {clubtag} has been set in this server!"
             )
-        if len(get_server_logs(inter.guild.id)) >= 5:
+        if len(await get_server_logs(inter.guild.id)) >= 5:
             return await inter.followup.send("Max 5 logs/server!")
 
-        insert_discord_info(clubtag, inter.guild_id, channelid or inter.channel_id)
+        await insert_discord_info(clubtag, inter.guild_id, channelid or inter.channel_id)
         await inter.followup.send(f"Successfully set a log for {clubtag}.")
 
     @slash_command()
@@ -200,12 +200,12 @@ class MyCog(commands.Cog):
         "remove particular clan league log on this server"
         view = disnake.ui.View(timeout=90)
         await inter.response.defer(with_message=True)
-        await inter.followup.send(view=view.add_item(LogSelect(inter.guild_id)))
+        logs = await get_server_logs(inter.guild_id)
+        await inter.followup.send(view=view.add_item(LogSelect(logs)))
 
 
 class LogSelect(disnake.ui.StringSelect):
-    def __init__(self, serverid):
-        logs = get_server_logs(serverid)
+    def __init__(self, logs: list[dict]):
         super().__init__(
             custom_id="log",
             placeholder="Select a log(s) to be removed.",
@@ -215,5 +215,5 @@ class LogSelect(disnake.ui.StringSelect):
 
     async def callback(self, inter: disnake.AppCmdInter):
         await inter.response.defer(with_message=True)
-        remove_server_logs(inter.guild_id, self.values)
+        await remove_server_logs(inter.guild_id, self.values)
         await inter.followup.send(f"Successfully removed log(s) for {self.values}")
@@ -0,0 +1,114 @@
+"""
+Assigns club shards to tracker workers and collects their health.
+
+    python coordinator.py --shards 4 --port 8900
+
+Workers started with COORDINATOR_URL=http://host:8900 register here,
+get the first free shard and report to /heartbeat every
+HEARTBEAT_INTERVAL seconds (300 by default) with their latest poll cycle.
+A shard whose worker hasn't reported for --timeout seconds is handed
+to the next worker that registers. GET /health lists every shard.
+"""
+
+import argparse
+from aiohttp import web
+from time import monotonic
+
+
+class ShardState:
+    __slots__ = ("worker", "last_seen", "stats")
+
+    def __init__(self, worker: str) -> None:
+        self.worker = worker
+        self.last_seen = monotonic()
+        self.stats: dict = {}
+
+
+class Coordinator:
+    __slots__ = ("shard_count", "timeout", "shards")
+
+    def __init__(self, shard_count: int, *, timeout: float = 1800) -> None:
+        """
+        Parameters
+        ----------
+        shard_count: `int`
+            number of shards the clubs are split into
+        timeout: `float`
+            seconds without a heartbeat before a shard is reassigned
+        """
+        self.shard_count = shard_count
+        self.timeout = timeout
+        self.shards: list[ShardState] = [None] * shard_count
+
+    def healthy(self, state: ShardState) -> bool:
+        return state is not None and monotonic() - state.last_seen < self.timeout
+
+    def assign(self, worker: str) -> int | None:
+        for i, state in enumerate(self.shards):
+            if state is not None and state.worker == worker:
+                state.last_seen = monotonic()
+                return i
+        for i, state in enumerate(self.shards):
+            if not self.healthy(state):
+                self.shards[i] = ShardState(worker)
+                return i
+        return None
+
+    async def register(self, request: web.Request):
+        worker = (await request.json())["worker"]
+        shard_id = self.assign(worker)
+        if shard_id is None:
+            return web.json_response({"error": "every shard is taken"}, status=503)
+        print(f"{worker} was assigned shard {shard_id}")
+        return web.json_response(
+            {"shard_id": shard_id, "shard_count": self.shard_count}
+        )
+
+    async def heartbeat(self, request: web.Request):
+        data = await request.json()
+        worker, shard_id = data.pop("worker"), data.pop("shard_id")
+        state = self.shards[shard_id] if 0 <= shard_id < self.shard_count else None
+        if state is None or state.worker != worker:
+            return web.json_response({"error": "shard is not yours"}, status=409)
+        state.last_seen = monotonic()
+        state.stats = data
+        return web.json_response({"shard_id": shard_id})
+
+    async def health(self, request: web.Request):
+        now = monotonic()
+        return web.json_response(
+            {
+                "shard_count": self.shard_count,
+                "shards": [
+                    {
+                        "id": i,
+                        "worker": s and s.worker,
+                        "healthy": self.healthy(s),
+                        "last_seen": s and round(now - s.last_seen),
+                        "stats": s and s.stats,
+                    }
+                    for i, s in enumerate(self.shards)
+                ],
+            }
+        )
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/register", self.register)
+        app.router.add_post("/heartbeat", self.heartbeat)
+        app.router.add_get("/health", self.health)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shards", type=int, required=True)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--timeout", type=float, default=1800)
+    args = parser.parse_args()
+    web.run_app(
+        Coordinator(args.shards, timeout=args.timeout).app(),
+        host=args.host,
+        port=args.port,
+    )
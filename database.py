@@ -1,42 +1,53 @@
-from supabase import create_client
-from brawlstars.http import BrawlStarsClient, Battle
+from brawlstars.http import Battle
+from concurrent.futures import ThreadPoolExecutor
+from storage import create_storage
+from metrics import DB_CALLS, DB_ERRORS, DB_SECONDS
+import asyncio
+import gzip
 import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
-import supabase
 
-supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
-club_members_table = supabase.table("club_members")
-club_league_table = supabase.table("club_league")
-clubs_table = supabase.table("clubs")
-discord_table = supabase.table("discord")
+# supabase by default, or the embedded sqlite database
+# with STORAGE_BACKEND=sqlite (see storage.create_storage)
+backend = create_storage()
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+
+# the backends are synchronous, so queries run on a bounded
+# pool of threads instead of blocking the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_WORKERS", 8)), thread_name_prefix="database"
+)
+
+
+async def _run(name: str, func, *args):
+    """runs `func(*args)` on the database thread pool,
+    counted and timed as `name`"""
+    DB_CALLS.inc(function=name)
+    with DB_SECONDS.time(function=name):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                _executor, func, *args
+            )
+        except Exception:
+            DB_ERRORS.inc(function=name)
+            raise
 
 
 def create_battle_id(playertag, battletime):
     return f"{playertag[1:]}{battletime.timestamp():.0f}"
 
 
-async def reset_club(client: BrawlStarsClient, clubtag: str):
-    club = await client.get_club(clubtag)
-    clubmembers = await client.get_club_members(clubtag)
-    clubmembers = [
-        {
-            "playertag": p.tag,
-            "playername": p.name,
-            "clubname": club.name,
-            "clubtag": club.tag,
-            "tickets": 0,
-            "trophy": 0,
-        }
-        async for p in clubmembers
-    ]
-    oldmembers = club_members_table.delete().eq("clubtag", club.tag).execute()
-    newmembers = club_members_table.insert(clubmembers).execute()
-    return oldmembers.data, newmembers.data
-
-
-def insert_log(playertag: str, log: Battle, tickets: int):
+async def reset_club(clubtag: str, clubmembers: list[dict]):
+    """replaces the club's members with `clubmembers` (club_members rows)"""
+    oldmembers = await _run("reset_club", backend.delete_club_members, clubtag)
+    newmembers = await _run("reset_club", backend.insert_club_members, clubmembers)
+    return oldmembers, newmembers
+
+
+def _battle_row(playertag: str, log: Battle, tickets: int) -> dict:
     """
     # NOTE: does not support showdowns
     # because club league is all 3v3
@@ -48,48 +59,60 @@ def insert_log(playertag: str, log: Battle, tickets: int):
         team = [i.name for i in log.teams[1]]
         opponent = [i.name for i in log.teams[0]]
 
-    data = club_league_table.insert(
-        {
-            "battle_id": create_battle_id(playertag, log.battleTime),
-            "playertag": playertag,
-            "team": team,
-            "opponent": opponent,
-            "map": log.event.map,
-            "type": log.type,
-            "result": log.result,
-            "ticket": tickets,
-            "trophychange": log.trophyChange,
-            "time": round(log.battleTime.timestamp()),
-        }
-    ).execute()
-    return data.data
-
-
-def check_if_exists(arg, table, field):
-    match table:
-        case "club_league":
-            _table = club_league_table
-        case "club_members":
-            _table = club_members_table
-        case "clubs":
-            _table = clubs_table
-        case "discord":
-            _table = discord_table
-        case _:
-            raise ValueError(f"the table '{table}' does not exist.")
-
-    data = _table.select(field).eq(field, arg).execute()
-    if not data.data:
-        return False
-    return True
-
-
-def inc_ticket_and_trophy(ptag: str, tix: int, trophychange: int):
-    data = supabase.rpc("inc_ticket_and_trophy", {"ptag": ptag, "tix": tix, "trophychange": trophychange}).execute()
-    return data.data
-
-
-def get_club_members(clubtag):
+    return {
+        "battle_id": create_battle_id(playertag, log.battleTime),
+        "playertag": playertag,
+        "team": team,
+        "opponent": opponent,
+        "map": log.event.map,
+        "type": log.type,
+        "result": log.result,
+        "ticket": tickets,
+        "trophychange": log.trophyChange,
+        "time": round(log.battleTime.timestamp()),
+    }
+
+
+async def store_logs(logs: list[tuple[str, Battle, int]]) -> list[dict]:
+    """stores every (playertag, battle, tickets) in `logs` that isn't
+    stored yet and adds its tickets and trophies to the member, all in
+    one transaction with the `store_logs` rpc, so a failure can't leave
+    battles stored without their increments. Returns the rows inserted:
+
+        create or replace function store_logs(logs jsonb)
+        returns setof club_league language sql as $$
+            with inserted as (
+                insert into club_league (battle_id, playertag, team, opponent,
+                    map, type, result, ticket, trophychange, time)
+                select battle_id, playertag, team, opponent,
+                    map, type, result, ticket, trophychange, time
+                from jsonb_populate_recordset(null::club_league, logs)
+                on conflict (battle_id) do nothing
+                returning *
+            ), totals as (
+                select playertag, sum(ticket) as tix,
+                    sum(trophychange) as trophychange
+                from inserted group by playertag
+            ), updated as (
+                update club_members m
+                set tickets = m.tickets + t.tix,
+                    trophy = m.trophy + t.trophychange
+                from totals t
+                where m.playertag = t.playertag
+            )
+            select * from inserted;
+        $$;
+    """
+    if not logs:
+        return []
+    return await _run("store_logs", backend.store_logs, [_battle_row(*i) for i in logs])
+
+
+async def check_if_exists(arg, table, field):
+    return await _run("check_if_exists", backend.exists, table, field, arg)
+
+
+async def get_club_members(clubtag):
     """returns an array of {
         playertag: #XXXXXXXXX,
         playername: str,
@@ -98,43 +121,58 @@ def get_club_members(clubtag):
         tickets: int,
         trophy: int
     }"""
-    data = club_members_table.select("*").eq("clubtag", clubtag).execute()
-    return data.data
+    return await _run("get_club_members", backend.get_club_members, clubtag)
 
 
-def get_member_log(membertag):
-    data = supabase.rpc("get_member_log", {"membertag": membertag}).execute()
-    return data.data
+async def insert_club_members(clubmembers: list[dict]):
+    if not clubmembers:
+        return []
+    return await _run("insert_club_members", backend.insert_club_members, clubmembers)
 
 
-def insert_club(clubtag, clubrank):
-    data = (
-        clubs_table.insert(
-            {
-                "clubtag": clubtag,
-                "clubrank": clubrank.lower(),
-            }
-        )
-        .execute()
+async def remove_club_members(playertags: list[str]):
+    if not playertags:
+        return []
+    return await _run("remove_club_members", backend.remove_club_members, playertags)
+
+
+async def rename_club_members(names: dict[str, str]):
+    """sets the playername of every playertag in `names`"""
+    if not names:
+        return
+    return await _run("rename_club_members", backend.rename_club_members, names)
+
+
+async def get_member_log(membertag):
+    return await _run("get_member_log", backend.get_member_log, membertag)
+
+
+async def insert_club(clubtag, clubrank):
+    return await _run(
+        "insert_club",
+        backend.insert_club,
+        {
+            "clubtag": clubtag,
+            "clubrank": clubrank.lower(),
+        },
     )
-    return data.data
 
 
-def insert_discord_info(
+async def insert_discord_info(
     clubtag: str, serverid: int, channelid: int
 ):
-    data = discord_table.insert(
-            {
-                "clubtag": clubtag,
-                "serverid": serverid,
-                "channelid": channelid,
-            }
-        ).execute()
-    
-    return data.data
+    return await _run(
+        "insert_discord_info",
+        backend.insert_discord_info,
+        {
+            "clubtag": clubtag,
+            "serverid": serverid,
+            "channelid": channelid,
+        },
+    )
 
 
-def get_clubs():
+async def get_clubs():
     """
     returns an `array` of {
         clubtag: str,
@@ -147,13 +185,9 @@ def get_clubs():
     }
     """
 
-    clubs = clubs_table.select("*").execute().data
-    data = (
-        discord_table.select("*")
-        .neq("channelid", 0)
-        .in_("clubtag", [i["clubtag"] for i in clubs])
-        .execute()
-        .data
+    clubs = await _run("get_clubs", backend.get_clubs)
+    data = await _run(
+        "get_clubs", backend.get_discord_info, [i["clubtag"] for i in clubs]
     )
     for c in clubs:
         c["discord"] = [
@@ -169,41 +203,39 @@ def get_clubs():
     return clubs
 
 
-def edit_discord_info(edit:dict, clubtag:str, serverid:int):
-    data = (
-        discord_table.update(edit)
-        .eq("clubtag", clubtag)
-        .eq("serverid", serverid)
-        .execute()
+async def edit_discord_info(edit:dict, clubtag:str, serverid:int):
+    return await _run(
+        "edit_discord_info", backend.edit_discord_info, edit, clubtag, serverid
     )
-    return data.data
 
 
-def get_server_logs(serverid):
-    data = discord_table.select("*").eq("serverid", serverid).execute()
-    return data.data
+async def get_server_logs(serverid):
+    return await _run("get_server_logs", backend.get_server_logs, serverid)
 
 
-def remove_server_logs(serverid, clubtags: list):
-    data = (
-        discord_table.delete()
-        .eq("serverid", serverid)
-        .in_("clubtag", clubtags)
-        .execute()
+async def remove_server_logs(serverid, clubtags: list):
+    return await _run(
+        "remove_server_logs", backend.remove_server_logs, serverid, clubtags
     )
-    return data.data
 
 
-def export_battle_logs(time, clubtag):
-    logs = {"clubtag": clubtag, "ClubLeagueTime": str(time.date())}
-    members = (
-        club_members_table.select("playertag", "playername")
-        .eq("clubtag", clubtag)
-        .execute()
+def _write_export(path: str, clubtag: str):
+    count = 0
+    with gzip.open(path, "wt", encoding="utf8") as f:
+        for row in backend.iter_club_logs(clubtag):
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+async def export_battle_logs(time, clubtag) -> str:
+    """streams a club's club league logs of the week to its own
+    gzipped NDJSON file (one battle per line) and returns its path"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(
+        EXPORT_DIR, f"{clubtag.lstrip('#')}-{time.date()}.ndjson.gz"
     )
-    for d in members.data:
-        data = club_league_table.select("*").eq("playertag", d["playertag"]).execute()
-        logs[d["playername"]] = data.data
-    with open("club_league_logs.json", "w", encoding="utf8") as f:
-        json.dump(logs, f, ensure_ascii=False)
-    print(f"exported club league logs for {clubtag} on {time}")
+    count = await _run("export_battle_logs", _write_export, path, clubtag)
+    print(f"exported {count} club league logs for {clubtag} on {time}")
+    return path
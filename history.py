@@ -0,0 +1,246 @@
+from array import array
+from sys import intern
+from typing import Iterator, NamedTuple, Optional
+from brawlstars import Battle
+
+# the characters player tags are written with, a tag is a number in base 14
+TAG_CHARACTERS = "0289PYLQGRJCUV"
+_DIGITS = {c: i for i, c in enumerate(TAG_CHARACTERS)}
+# set on the ids of tags written with other characters
+_ODD = 1 << 63
+
+
+class Teammate(NamedTuple):
+    tag: str
+    name: str
+    brawler: str
+
+
+class BattleRecord(NamedTuple):
+    time: int
+    playertag: str
+    map: str
+    mode: str
+    type: str
+    result: str
+    tickets: int
+    trophyChange: int
+    team: tuple[Teammate, ...]
+    opponent: tuple[Teammate, ...]
+
+
+class StringTable:
+    __slots__ = ("_ids", "_values")
+
+    def __init__(self) -> None:
+        """Gives every distinct string a small int id, 0 is None"""
+        self._ids: dict[Optional[str], int] = {None: 0}
+        self._values: list[Optional[str]] = [None]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, id: int) -> Optional[str]:
+        return self._values[id]
+
+    def get(self, value: Optional[str]) -> Optional[int]:
+        return self._ids.get(value)
+
+    def id(self, value: Optional[str]) -> int:
+        try:
+            return self._ids[value]
+        except KeyError:
+            id = self._ids[value] = len(self._values)
+            self._values.append(intern(value))
+            return id
+
+
+# typecode of the columns with one item per battle
+_BATTLE_COLUMNS = {
+    "_time": "I",
+    "_player": "Q",
+    "_map": "H",
+    "_mode": "B",
+    "_type": "B",
+    "_result": "B",
+    "_tickets": "B",
+    "_trophies": "b",
+    # where the battle's players start and how many of them are teammates
+    "_first": "I",
+    "_team": "B",
+}
+# and with one item per player of every battle
+_PLAYER_COLUMNS = {
+    "_tags": "Q",
+    "_brawlers": "H",
+    # where the player's name ends in _name_bytes
+    "_name_end": "I",
+}
+
+
+class BattleHistory:
+    __slots__ = (
+        *_BATTLE_COLUMNS,
+        *_PLAYER_COLUMNS,
+        "_name_bytes",
+        "_by_player",
+        "odd_tags",
+        "maps",
+        "modes",
+        "types",
+        "results",
+        "brawlers",
+    )
+
+    def __init__(self) -> None:
+        """
+        The club league battles stored this week, kept in memory as
+        arrays of small ints instead of `Battle` objects.
+
+        Maps, modes, battle types, results and brawlers are stored once
+        in a `StringTable` and referred to by id, player tags are stored
+        as the number they spell and names are packed in a single
+        bytearray, so a 3v3 battle takes under 200 bytes.
+        `BattleRecord`s are only built when the battles are read.
+        """
+        for column, typecode in (_BATTLE_COLUMNS | _PLAYER_COLUMNS).items():
+            setattr(self, column, array(typecode))
+        self._name_bytes = bytearray()
+        # member's tag id -> indexes of their battles
+        self._by_player: dict[int, array] = {}
+        self.odd_tags = StringTable()
+        self.maps = StringTable()
+        self.modes = StringTable()
+        self.types = StringTable()
+        self.results = StringTable()
+        self.brawlers = StringTable()
+
+    def __len__(self) -> int:
+        return len(self._time)
+
+    @property
+    def nbytes(self) -> int:
+        """bytes used by the arrays, without the string tables"""
+        columns = [getattr(self, c) for c in _BATTLE_COLUMNS | _PLAYER_COLUMNS]
+        columns.extend(self._by_player.values())
+        return sum(a.itemsize * len(a) for a in columns) + len(self._name_bytes)
+
+    def tag_id(self, tag: str, *, add: bool = True) -> Optional[int]:
+        """the number a tag spells (with a leading 1, so zeros count),
+        or an id from `odd_tags` if it isn't written like a tag"""
+        id = 1
+        for c in tag.lstrip("#"):
+            digit = _DIGITS.get(c)
+            if digit is None:
+                break
+            id = id * 14 + digit
+        else:
+            if id < _ODD:
+                return id
+        id = self.odd_tags.id(tag) if add else self.odd_tags.get(tag)
+        return None if id is None else _ODD | id
+
+    def tag(self, id: int) -> str:
+        if id & _ODD:
+            return self.odd_tags[id & ~_ODD]
+        characters = []
+        while id > 1:
+            id, digit = divmod(id, 14)
+            characters.append(TAG_CHARACTERS[digit])
+        return "#" + "".join(reversed(characters))
+
+    def add(self, playertag: str, battle: Battle, tickets: int):
+        """records a stored club league battle of member `playertag`"""
+        # the member's team first, like the club_league rows
+        team, opponent = battle.teams
+        if playertag not in (p.tag for p in team):
+            team, opponent = opponent, team
+        index = len(self._time)
+        player = self.tag_id(playertag)
+        self._time.append(round(battle.battleTime.timestamp()))
+        self._player.append(player)
+        self._map.append(self.maps.id(battle.event.map))
+        self._mode.append(self.modes.id(battle.event.mode))
+        self._type.append(self.types.id(battle.type))
+        self._result.append(self.results.id(battle.result))
+        self._tickets.append(tickets)
+        self._trophies.append(battle.trophyChange)
+        self._first.append(len(self._tags))
+        self._team.append(len(team))
+        for p in (*team, *opponent):
+            self._tags.append(self.tag_id(p.tag))
+            self._brawlers.append(self.brawlers.id(p.brawler.name))
+            self._name_bytes += (p.name or "").encode()
+            self._name_end.append(len(self._name_bytes))
+        self._by_player.setdefault(player, array("I")).append(index)
+
+    def _end(self, index: int) -> int:
+        """where the players of the battle after `index` start"""
+        return self._first[index + 1] if index + 1 < len(self) else len(self._tags)
+
+    def _teammates(self, start: int, end: int) -> tuple[Teammate, ...]:
+        ends = self._name_end
+        return tuple(
+            Teammate(
+                self.tag(self._tags[i]),
+                self._name_bytes[ends[i - 1] if i else 0 : ends[i]].decode(),
+                self.brawlers[self._brawlers[i]],
+            )
+            for i in range(start, end)
+        )
+
+    def record(self, index: int) -> BattleRecord:
+        first = self._first[index]
+        split = first + self._team[index]
+        return BattleRecord(
+            self._time[index],
+            self.tag(self._player[index]),
+            self.maps[self._map[index]],
+            self.modes[self._mode[index]],
+            self.types[self._type[index]],
+            self.results[self._result[index]],
+            self._tickets[index],
+            self._trophies[index],
+            self._teammates(first, split),
+            self._teammates(split, self._end(index)),
+        )
+
+    def member(self, playertag: str) -> list[BattleRecord]:
+        """the recorded battles of a member, in the order they were added"""
+        indexes = self._by_player.get(self.tag_id(playertag, add=False), ())
+        return [self.record(i) for i in indexes]
+
+    def __iter__(self) -> Iterator[BattleRecord]:
+        return (self.record(i) for i in range(len(self)))
+
+    def drop_before(self, time: int):
+        """forgets the battles played before `time`,
+        e.g. the ones of the last club league week"""
+        if not self._time or min(self._time) >= time:
+            return
+        keep = [i for i, t in enumerate(self._time) if t >= time]
+        ends = [self._end(i) for i in keep]
+        players = [j for i, end in zip(keep, ends) for j in range(self._first[i], end)]
+        for column, typecode in _BATTLE_COLUMNS.items():
+            old = getattr(self, column)
+            setattr(self, column, array(typecode, (old[i] for i in keep)))
+        for column in ("_tags", "_brawlers"):
+            old = getattr(self, column)
+            setattr(self, column, array(old.typecode, (old[j] for j in players)))
+        names, name_end = self._name_bytes, self._name_end
+        self._name_bytes = bytearray()
+        self._name_end = array("I")
+        for j in players:
+            self._name_bytes += names[name_end[j - 1] if j else 0 : name_end[j]]
+            self._name_end.append(len(self._name_bytes))
+        first = 0
+        self._by_player = {}
+        for index, end in enumerate(ends):
+            # _first still holds where the battle's players were
+            count = end - self._first[index]
+            self._first[index] = first
+            first += count
+            self._by_player.setdefault(self._player[index], array("I")).append(index)
+
+    def clear(self):
+        self.__init__()
@@ -0,0 +1,57 @@
+from bisect import bisect_left, insort
+from utils import format_member_line
+
+
+def _rank(row: dict) -> tuple:
+    # most trophies first, then most tickets
+    return (-row["trophy"], -row["tickets"], row["playertag"])
+
+
+class ClubStats:
+    __slots__ = ("trophy", "tickets", "_ranks", "_order", "_lines", "_description")
+
+    def __init__(self, members: list[dict]) -> None:
+        """
+        A club's totals and leaderboard, updated member by member as
+        battles are stored instead of being recomputed from every row.
+
+        Parameters
+        ----------
+        members: `list[dict]`
+            the club's club_members rows
+        """
+        self.trophy = sum(m["trophy"] for m in members)
+        self.tickets = sum(m["tickets"] for m in members)
+        self._ranks: dict[str, tuple] = {m["playertag"]: _rank(m) for m in members}
+        self._order: list[tuple] = sorted(self._ranks.values())
+        self._lines: dict[str, str] = {
+            m["playertag"]: format_member_line(m) for m in members
+        }
+        self._description: str = None
+
+    def __len__(self) -> int:
+        return len(self._ranks)
+
+    def update(self, member: dict, tickets: int, trophychange: int):
+        """records that `member` (a club_members row, already
+        updated) gained `tickets` and `trophychange`"""
+        tag = member["playertag"]
+        old = self._ranks.get(tag)
+        if old is None:
+            return
+        self.trophy += trophychange
+        self.tickets += tickets
+        new = self._ranks[tag] = _rank(member)
+        if new != old:
+            del self._order[bisect_left(self._order, old)]
+            insort(self._order, new)
+        self._lines[tag] = format_member_line(member)
+        self._description = None
+
+    @property
+    def description(self) -> str:
+        """the leaderboard, one line per member, only
+        joined again after a member's stats changed"""
+        if self._description is None:
+            self._description = "".join(self._lines[r[2]] for r in self._order)
+        return self._description
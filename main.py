@@ -1,21 +1,25 @@
 import asyncio
 import disnake
-from disnake.ext.commands import InteractionBot
+from disnake.ext.commands import CommandSyncFlags, InteractionBot
 from commands import MyCog
-from brawlstars import BrawlStarsClient
+from brawlstars import BrawlStarsClient, TTLCache
+from pipeline import Pipeline
+from tracker import BS_TIMEZONE, ClubLeagueTracker
+from roster import RosterCache
+from watermark import Watermarks
+from render import EditTracker, MessageCache
+from tickets import TicketTracker
+from shard import Shard
 from loop import Loop, from_weekday
+from watchdog import LoopWatchdog
+from metrics import REGISTRY, CYCLE_SECONDS, LAST_CYCLE, DISCORD_EDITS, observe_request
 from database import (
-    reset_club,
-    insert_log,
-    check_if_exists,
-    inc_ticket_and_trophy,
-    get_club_members,
     get_clubs,
-    create_battle_id,
     edit_discord_info,
     export_battle_logs,
 )
-from utils import format_member_stats, clubrank
+from leaderboard import ClubStats
+from utils import clubrank
 from datetime import timezone, timedelta, datetime
 import os
 from dotenv import load_dotenv
@@ -27,14 +31,68 @@ load_dotenv()
 loop = asyncio.get_event_loop()
 asyncio.set_event_loop(loop)
 
-client = BrawlStarsClient(email=os.getenv("EMAIL"), password=os.getenv("PWD"))
-
+# logs and counts the calls blocking the event loop
+# for longer than LOOP_LAG_THRESHOLD seconds, started by `starter`
+watchdog = LoopWatchdog(loop, threshold=float(os.getenv("LOOP_LAG_THRESHOLD", 0.25)))
+
+# clubs are split across worker processes with SHARD_ID and SHARD_COUNT
+# or with COORDINATOR_URL, see shard.py and coordinator.py
+shard = loop.run_until_complete(Shard.from_env())
+# workers on the same host must not share these files
+_shard_suffix = f"-{shard.id}" if shard.sharded else ""
+
+# GET /metrics on METRICS_PORT, plus the shard id so workers on the
+# same host don't collide. METRICS_PORT=0 disables it
+_metrics_port = int(os.getenv("METRICS_PORT", 9108))
+if _metrics_port:
+    metrics_runner = loop.run_until_complete(
+        REGISTRY.serve(os.getenv("METRICS_HOST", "127.0.0.1"), _metrics_port + shard.id)
+    )
 
+# every worker logs in to the same account, which allows 10 keys in total
+_key_count = int(os.getenv("API_KEYS", 1))
+if shard.sharded and _key_count > 10 // shard.count:
+    raise ValueError(
+        f"API_KEYS={_key_count} is more than the {10 // shard.count} keys "
+        f"each of the {shard.count} shards can have"
+    )
+client = BrawlStarsClient(
+    email=os.getenv("EMAIL"),
+    password=os.getenv("PWD"),
+    key_count=_key_count,
+    key_cache=os.getenv("API_KEY_CACHE", f".brawlstars_keys{_shard_suffix}.json"),
+    # keys are only revoked by the worker that created them. Unsharded
+    # this is the client's default name, so keys created before it had
+    # one still make room
+    key_name=os.getenv("API_KEY_NAME", f"key{_shard_suffix}"),
+    rate_limit=float(os.getenv("API_RATE_LIMIT", 0)) or None,
+    cache=TTLCache(maxsize=int(os.getenv("API_CACHE_SIZE", 4096))),
+    on_request=observe_request,
+)
+watermarks = Watermarks(os.getenv("WATERMARK_PATH", f"watermarks{_shard_suffix}.json"))
+tickets = TicketTracker(idle_every=int(os.getenv("IDLE_POLL_EVERY", 3)))
+# unchanged stats only get their timestamp bumped every STATS_REFRESH seconds
+edits = EditTracker(refresh=float(os.getenv("STATS_REFRESH", 3600)) or None)
+# members of every club, compared with the api every ROSTER_TTL seconds
+roster = RosterCache(client, ttl=float(os.getenv("ROSTER_TTL", 1800)))
+tracker = ClubLeagueTracker(watermarks, roster)
+
+
+# slash commands are answered and synced by a single worker, decided
+# once at startup: shard.id may change when the coordinator reassigns
+# shards, this doesn't. SLASH_COMMANDS=1/0 picks the worker explicitly
+serves_commands = bool(int(os.getenv("SLASH_COMMANDS", shard.id == 0)))
 bot = InteractionBot(
     activity=disnake.Activity(name="your club", type=disnake.ActivityType.watching),
     loop=loop,
+    # other workers have no commands, syncing would delete the global ones
+    command_sync_flags=(
+        CommandSyncFlags.default() if serves_commands else CommandSyncFlags.none()
+    ),
 )
-bot.add_cog(MyCog(client))
+if serves_commands:
+    bot.add_cog(MyCog(client))
+message_cache = MessageCache(bot)
 
 
 @bot.listen()
@@ -48,123 +106,177 @@ async def on_ready():
     print(f"on_ready : {datetime.now(timezone(timedelta(hours=7)))}")
 
 
-async def send_club_stats(
-    members: list[dict], discord_info, club_name, club_tag, club_rank
-):
+def stats_embed(stats: ClubStats, club_name, club_rank):
     now = datetime.utcnow()
-    desc, trophy = format_member_stats(members)
-
-    embed = (
+    return (
         disnake.Embed(
             title=f"{now.date()} | {club_name}'s Club League",
-            description=desc,
+            description=stats.description,
         )
         .add_field(
-            name=f"Total Eligible Member: {len(members)}",
+            name=f"Total Eligible Member: {len(stats)}",
             value="\u200b",
             inline=False,
         )
         .add_field(
-            name=f"Total Trophy: {trophy}",
+            name=f"Total Trophy: {stats.trophy} | Total Tickets: {stats.tickets}",
             value=f"last updated at <t:{now.timestamp():.0f}:f> <t:{now.timestamp():.0f}:R>",
             inline=False,
         )
         .set_thumbnail(clubrank[club_rank])
     )
 
+
+async def set_discord_info(edit: dict, clubtag: str, serverid: int):
+    """edit_discord_info that also drops the server's cached handles"""
+    message_cache.invalidate(serverid)
+    return await edit_discord_info(edit, clubtag, serverid)
+
+
+async def send_club_stats(
+    stats: ClubStats, discord_info, club_name, club_tag, club_rank, path=None
+):
+    """posts a new stats message, with the file at `path` attached if given"""
+    embed = stats_embed(stats, club_name, club_rank)
+
     try:
         channel = await bot.fetch_channel(discord_info["channelid"])
-    except:
-        edit_discord_info({"channelid": 0}, club_tag, discord_info["serverid"])
+        if path is None:
+            message = await channel.send(embed=embed)
+        else:
+            message = await channel.send(embed=embed, file=disnake.File(path))
+    except (disnake.NotFound, disnake.Forbidden):
+        await set_discord_info({"channelid": 0}, club_tag, discord_info["serverid"])
         return
-    message = await channel.send(embed=embed)
-    edit_discord_info({"messageid": message.id}, club_tag, discord_info["serverid"])
+    await set_discord_info(
+        {"messageid": message.id}, club_tag, discord_info["serverid"]
+    )
+    message_cache.add(discord_info["serverid"], message)
 
 
 async def update_club_stats(data):
-    members = get_club_members(data["clubtag"])
-    messages: list[disnake.Message] = []
-    for i in data["discord"]:
-        try:
-            channel = await bot.fetch_channel(i["channelid"])
-        except:
-            edit_discord_info({"channelid": 0}, data["clubtag"], i["serverid"])
-            continue
-        try:
-            message = await channel.fetch_message(i["messageid"])
-        except:
-            loop.create_task(
-                send_club_stats(
-                    members,
-                    i,
-                    members[0]["clubname"],
-                    data["clubtag"],
-                    data["clubrank"],
-                )
+    members = await roster.get(data["clubtag"])
+    stats = roster.stats(data["clubtag"])
+    now = datetime.utcnow()
+    week_ended = now.astimezone(BS_TIMEZONE) > CL_WEEK
+    # the week's export goes with every message, edited or posted again
+    path = await export_battle_logs(CL_WEEK, data["clubtag"]) if week_ended else None
+
+    def resend(discord_info):
+        loop.create_task(
+            send_club_stats(
+                stats,
+                discord_info,
+                members[0]["clubname"],
+                data["clubtag"],
+                data["clubrank"],
+                path,
             )
-            continue
+        )
+
+    # partial messages can be edited without fetching channel or message.
+    # New registrations and messages that were gone have none yet and are
+    # sent whether or not the stats changed
+    messages: list[tuple[dict, disnake.PartialMessage]] = []
+    for i in data["discord"]:
+        if not i["messageid"]:
+            resend(i)
         else:
-            messages.append(message)
+            messages.append(
+                (i, message_cache.get(i["serverid"], i["channelid"], i["messageid"]))
+            )
 
+    fingerprint = edits.fingerprint(stats.description, stats.trophy, len(stats))
+    if not week_ended and not edits.needs_edit(data["clubtag"], fingerprint):
+        DISCORD_EDITS.inc(len(messages), result="skipped")
+        return
     if messages == []:
         return
-    now = datetime.utcnow()
-    embed = messages[0].embeds[0]
-    embed.description, trophy = format_member_stats(members)
-    embed.set_field_at(
-        1,
-        name=f"Total Trophy: {trophy}",
-        value=f"last updated at <t:{now.timestamp():.0f}>",
-        inline=False,
-    )
+    embed = stats_embed(stats, members[0]["clubname"], data["clubrank"])
 
-    if now.astimezone(BS_TIMEZONE) > CL_WEEK:
-        export_battle_logs(CL_WEEK, data["clubtag"])
-        await asyncio.gather(
-            *(
-                m.edit(embed=embed, file=disnake.File("club_league_logs.json"))
-                for m in messages
-            )
+    if week_ended:
+        results = await asyncio.gather(
+            *(m.edit(embed=embed, file=disnake.File(path)) for _, m in messages),
+            return_exceptions=True,
+        )
+    else:
+        results = await asyncio.gather(
+            *(m.edit(embed=embed) for _, m in messages), return_exceptions=True
         )
-        await reset_club(client, data["clubtag"])
-        return
-
-    await asyncio.gather(*(m.edit(embed=embed) for m in messages))
 
+    failed = sum(isinstance(r, Exception) for r in results)
+    DISCORD_EDITS.inc(len(results) - failed, result="sent")
+    DISCORD_EDITS.inc(failed, result="failed")
+    for (i, _), r in zip(messages, results):
+        if isinstance(r, (disnake.NotFound, disnake.Forbidden)):
+            # the message or channel is gone, post a new one
+            message_cache.invalidate(i["serverid"])
+            resend(i)
+        elif isinstance(r, Exception):
+            raise r
+
+    if week_ended:
+        await roster.reset(data["clubtag"])
+        edits.forget(data["clubtag"])
+        return
+    edits.edited(data["clubtag"], fingerprint)
+
+
+# fetch -> classify -> persist -> render, each stage with its own workers
+pipeline = Pipeline(
+    client,
+    roster,
+    classify=tracker.check_logs,
+    persist=tracker.persist,
+    render=update_club_stats,
+    workers={
+        "fetch": int(os.getenv("POLL_CONCURRENCY", 32)),
+        "classify": int(os.getenv("CLASSIFY_WORKERS", 4)),
+        "persist": int(os.getenv("PERSIST_WORKERS", 4)),
+        "render": int(os.getenv("RENDER_WORKERS", 4)),
+    },
+    maxsize=int(os.getenv("PIPELINE_QUEUE_SIZE", 256)),
+)
 
-async def check_logs(member, logs):
-    today = datetime.now(tz=BS_TIMEZONE).day
-    async for l in logs:
-        if l.battleTime.day != today or check_if_exists(
-            create_battle_id(member.tag, l.battleTime), "club_league", "battle_id"
-        ):
-            continue
 
-        if l.is_regular_CL_random() or l.is_regular_CL_team():
-            insert_log(member.tag, l, 1)
-            inc_ticket_and_trophy(member.tag, 1, l.trophyChange)
+async def CL_watcher():
+    start = datetime.now(tz=BS_TIMEZONE)
+    clubs = [c for c in await get_clubs() if shard.owns(c["clubtag"])]
+    try:
+        tickets.new_cycle(start)
+        results = await pipeline.run(
+            clubs, member_filter=tickets.should_poll
+        )
+    finally:
+        watermarks.save()
+    end = datetime.now(tz=BS_TIMEZONE)
+    CYCLE_SECONDS.observe((end - start).total_seconds())
+    LAST_CYCLE.set(end.timestamp())
+    last_cycle.update(
+        clubs=len(clubs),
+        failed_clubs=sum(isinstance(r, Exception) for r in results),
+        cycle_seconds=(end - start).total_seconds(),
+        cycle_end=end.isoformat(),
+        stages=pipeline.stats(),
+    )
 
-        elif l.is_power_match_CL_random() or l.is_power_match_CL_team():
-            insert_log(member.tag, l, 2)
-            inc_ticket_and_trophy(member.tag, 2, l.trophyChange)
 
+# stats of the latest poll cycle, sent with every heartbeat
+last_cycle: dict = {}
 
-# HACK: do this better?
-async def CL_watcher():
-    data = get_clubs()
-    for d in data:
-        members = await client.get_club_members(d["clubtag"])
 
-        async for m in members:
-            logs = await client.get_battle_log(m.tag)
-            loop.create_task(check_logs(m, logs))
-        await update_club_stats(d)
+async def heartbeat(interval: float):
+    """reports to the coordinator every `interval` seconds. Separate from
+    CL_watcher, which doesn't run between club league days, so the shard
+    isn't handed to another worker while this one is idle but alive"""
+    while True:
+        try:
+            await shard.heartbeat(**last_cycle)
+        except Exception as e:
+            print(f"could not report to the coordinator: {e!r}")
+        await asyncio.sleep(interval)
 
 
-# Brawl Stars Club League begins and ends at 00:00 UTC-9
-# but we give some leniency for first and last updates
-# because some people do club league at last minutes
-BS_TIMEZONE = timezone(timedelta(hours=-9, minutes=-5))
 CL_WEEK = from_weekday(0, tzinfo=timezone(timedelta(hours=-9)))
 
 
@@ -179,8 +291,19 @@ _club_league_monitor = Loop(
 
 
 async def starter():
+    # only once the loop runs for good, the setup between the blocking
+    # run_until_complete calls above would count as stalls
+    watchdog.start()
     await bot.wait_until_first_connect()
-    await asyncio.gather(_club_league_monitor.start())
+    await client.start()
+    tasks = [_club_league_monitor.start()]
+    if shard.coordinator is not None:
+        # well under the coordinator's --timeout (1800s by default)
+        tasks.append(heartbeat(float(os.getenv("HEARTBEAT_INTERVAL", 300))))
+    await asyncio.gather(*tasks)
 
 
-loop.run_until_complete(asyncio.gather(bot.start(os.getenv("TOKEN")), starter()))
+# the api keys are fetched while the bot logs in
+loop.run_until_complete(
+    asyncio.gather(bot.start(os.getenv("TOKEN")), client.start(), starter())
+)
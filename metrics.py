@@ -0,0 +1,275 @@
+"""
+Counters and histograms served in the Prometheus text format.
+
+    curl http://127.0.0.1:9108/metrics
+"""
+
+from aiohttp import web
+from bisect import bisect_left
+from math import inf
+from time import perf_counter
+
+# seconds, fit for api requests and database calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    __slots__ = ("name", "help", "labels", "_values")
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        """
+        Parameters
+        ----------
+        name: `str`
+            metric name, e.g. "brawlstars_requests_total"
+        help: `str`
+            description shown on the HELP line
+        labels: `tuple[str]`
+            names of the labels every sample is given
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if labels.keys() != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}")
+        return tuple(labels[n] for n in self.labels)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(
+            f"{name}{labels} {value}" for name, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    __slots__ = ()
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Gauge(Counter):
+    __slots__ = ()
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    __slots__ = ("buckets",)
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            # one count per bucket, then the sum
+            counts = self._values[key] = [0] * len(self.buckets) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """observes the seconds spent in a `with` block"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        for key, counts in self._values.items():
+            total = 0
+            for bound, count in zip(self.buckets, counts):
+                total += count
+                le = "+Inf" if bound == inf else repr(float(bound))
+                yield (
+                    self.name + "_bucket",
+                    _format_labels(self.labels, key, f'le="{le}"'),
+                    total,
+                )
+            labels = _format_labels(self.labels, key)
+            yield self.name + "_sum", labels, counts[-1]
+            yield self.name + "_count", labels, total
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: dict) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    __slots__ = ("metrics",)
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"{metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self.metrics.values()) + "\n"
+
+    async def handler(self, request: web.Request):
+        return web.Response(
+            text=self.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9108) -> web.AppRunner:
+        """serves GET /metrics in the running event loop"""
+        app = web.Application()
+        app.router.add_get("/metrics", self.handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"serving metrics on http://{host}:{port}/metrics")
+        return runner
+
+
+REGISTRY = Registry()
+
+API_REQUESTS = REGISTRY.register(
+    Counter(
+        "brawlstars_requests_total",
+        "Responses from the Brawl Stars api",
+        ("endpoint", "status"),
+    )
+)
+API_ERRORS = REGISTRY.register(
+    Counter(
+        "brawlstars_request_errors_total",
+        "Failed Brawl Stars api requests, by error class",
+        ("endpoint", "error"),
+    )
+)
+API_SECONDS = REGISTRY.register(
+    Histogram(
+        "brawlstars_request_seconds",
+        "Latency of Brawl Stars api requests",
+        ("endpoint",),
+    )
+)
+DB_CALLS = REGISTRY.register(
+    Counter("database_calls_total", "Storage backend calls", ("function",))
+)
+DB_ERRORS = REGISTRY.register(
+    Counter("database_errors_total", "Storage backend calls that raised", ("function",))
+)
+DB_SECONDS = REGISTRY.register(
+    Histogram(
+        "database_call_seconds",
+        "Latency of storage backend calls, including the wait for a thread",
+        ("function",),
+    )
+)
+CYCLE_SECONDS = REGISTRY.register(
+    Histogram(
+        "watcher_cycle_seconds",
+        "Duration of CL_watcher's poll cycles",
+        buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200),
+    )
+)
+LAST_CYCLE = REGISTRY.register(
+    Gauge("watcher_last_cycle_timestamp", "Unix time the last poll cycle ended")
+)
+BATTLES = REGISTRY.register(
+    Counter("watcher_battles_ingested_total", "Club league battles stored")
+)
+DISCORD_EDITS = REGISTRY.register(
+    Counter(
+        "discord_edits_total",
+        "Club stats messages edited (sent), left as they were "
+        "because nothing changed (skipped) or that could not be edited (failed)",
+        ("result",),
+    )
+)
+LOOP_LAG = REGISTRY.register(
+    Histogram(
+        "event_loop_lag_seconds",
+        "How late the event loop ran the watchdog's timer",
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+)
+LOOP_BLOCKS = REGISTRY.register(
+    Counter(
+        "event_loop_blocks_total",
+        "Times the event loop was blocked over the threshold, "
+        "by blocking function and its caller",
+        ("function", "caller"),
+    )
+)
+LOOP_BLOCKED_SECONDS = REGISTRY.register(
+    Counter(
+        "event_loop_blocked_seconds_total",
+        "Seconds the event loop was blocked, by blocking function",
+        ("function",),
+    )
+)
+
+# error class of every status that doesn't return data
+_ERRORS = {
+    None: "ConnectionError",
+    400: "BadRequest",
+    403: "Forbidden",
+    404: "NotFound",
+    429: "TooManyRequests",
+    500: "BrawlStarsServerError",
+    503: "BrawlStarsServerError",
+}
+
+
+def observe_request(endpoint: str, status: int | None, seconds: float):
+    """`BrawlStarsClient` on_request hook. `status` is None
+    when the request failed before getting a response"""
+    API_REQUESTS.inc(endpoint=endpoint, status=status or "none")
+    API_SECONDS.observe(seconds, endpoint=endpoint)
+    if status != 200:
+        API_ERRORS.inc(endpoint=endpoint, error=_ERRORS.get(status, "Unexpected"))
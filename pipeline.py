@@ -0,0 +1,292 @@
+import asyncio
+import sys
+import traceback
+from time import monotonic
+from brawlstars import BrawlStarsClient
+from roster import RosterCache
+
+
+class Stage:
+    __slots__ = (
+        "name",
+        "handler",
+        "workers",
+        "queue",
+        "processed",
+        "failed",
+        "busy",
+        "peak",
+        "maxsize",
+        "_next",
+    )
+
+    def __init__(self, name: str, handler, *, workers: int = 1, maxsize: int = 0):
+        """
+        One step of the pipeline: `workers` tasks take items from a
+        bounded queue and await `handler(item)` on them.
+
+        Attributes
+        ----------
+        processed: `int`
+            items handled this cycle
+        failed: `int`
+            items whose handler raised this cycle
+        busy: `float`
+            seconds spent inside the handler this cycle, summed over workers
+        peak: `int`
+            largest queue size seen this cycle
+        """
+        if workers < 1:
+            raise ValueError("a stage needs at least 1 worker")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.queue: asyncio.Queue = None
+        self._next: Stage = None
+        self.reset()
+
+    def reset(self):
+        """starts a new cycle with an empty queue and zeroed stats"""
+        self.queue = asyncio.Queue(self.maxsize)
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.peak = 0
+
+    async def put(self, item):
+        # blocks while the queue is full, which is what
+        # pushes back on the stages before this one
+        await self.queue.put(item)
+        self.peak = max(self.peak, self.queue.qsize())
+
+    async def _work(self, on_error):
+        while True:
+            item = await self.queue.get()
+            start = monotonic()
+            try:
+                result = await self.handler(item)
+            except Exception as e:
+                self.failed += 1
+                on_error(self, item, e)
+            else:
+                self.processed += 1
+                if self._next is not None and result is not None:
+                    await self._next.put(result)
+            finally:
+                self.busy += monotonic() - start
+                self.queue.task_done()
+
+    def stats(self, duration: float) -> dict:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy": round(self.busy, 2),
+            # near 1 means the stage is the bottleneck
+            "utilisation": self.busy / (self.workers * duration) if duration else 0,
+            "peak_queue": self.peak,
+        }
+
+
+class ClubBatch:
+    """Everything collected for one club during a cycle."""
+
+    __slots__ = ("club", "pending", "results", "done")
+
+    def __init__(self, club: dict) -> None:
+        self.club = club
+        self.pending = 0
+        self.results = []
+        self.done = asyncio.get_running_loop().create_future()
+
+    def finish(self, exception=None):
+        if not self.done.done():
+            if exception is None:
+                self.done.set_result(None)
+            else:
+                self.done.set_exception(exception)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        client: BrawlStarsClient,
+        roster: RosterCache,
+        *,
+        classify,
+        persist,
+        render,
+        workers: dict[str, int] = None,
+        maxsize: int = 256,
+    ) -> None:
+        """
+        The poll cycle as four stages joined by bounded queues:
+
+        fetch: one battle log per member of the club's roster, as raw json
+        classify: `classify(member, logs)` picks the club league battles
+        persist: `persist(club, results)` once every member of a club is classified
+        render: `render(club)` updates the club's discord messages
+
+        Parameters
+        ----------
+        client: `BrawlStarsClient`
+            client used for the requests
+        roster: `RosterCache`
+            where the members of every club come from
+        classify, persist, render: `Coroutine`
+            the handlers described above
+        workers: `dict[str, int]`
+            number of workers of each stage, by stage name
+        maxsize: `int`
+            capacity of each stage's queue
+        """
+        self.client = client
+        self.roster = roster
+        workers = {"fetch": 32, "classify": 4, "persist": 4, "render": 4} | (
+            workers or {}
+        )
+        self.fetch = Stage(
+            "fetch", self._fetch, workers=workers["fetch"], maxsize=maxsize
+        )
+        self.classify = Stage(
+            "classify", self._classify, workers=workers["classify"], maxsize=maxsize
+        )
+        self.persist = Stage(
+            "persist", self._persist, workers=workers["persist"], maxsize=maxsize
+        )
+        self.render = Stage(
+            "render", self._render, workers=workers["render"], maxsize=maxsize
+        )
+        self.fetch._next = self.classify
+        self.persist._next = self.render
+        self._classify_logs = classify
+        self._persist_results = persist
+        self._render_club = render
+        self.duration = 0.0
+
+    @property
+    def stages(self) -> tuple[Stage, ...]:
+        return (self.fetch, self.classify, self.persist, self.render)
+
+    async def _fetch(self, item):
+        batch, member = item
+        try:
+            logs = await self.client.get_battle_log_data(member["playertag"])
+            return batch, member, logs
+        except Exception:
+            # the club is complete without this member
+            await self._member_done(batch)
+            raise
+
+    async def _classify(self, item):
+        batch, member, logs = item
+        try:
+            batch.results.append(await self._classify_logs(member, logs))
+        finally:
+            await self._member_done(batch)
+
+    async def _member_done(self, batch: ClubBatch):
+        batch.pending -= 1
+        if batch.pending == 0:
+            await self.persist.put(batch)
+
+    async def _persist(self, batch: ClubBatch):
+        try:
+            await self._persist_results(batch.club, batch.results)
+        except Exception as e:
+            batch.finish(e)
+            raise
+        return batch
+
+    async def _render(self, batch: ClubBatch):
+        try:
+            await self._render_club(batch.club)
+        except Exception as e:
+            batch.finish(e)
+            raise
+        batch.finish()
+
+    async def _feed(self, batch: ClubBatch, member_filter):
+        members = await self.roster.get(batch.club["clubtag"])
+        members = [m for m in members if member_filter is None or member_filter(m)]
+        batch.pending = len(members)
+        if not members:
+            await self.persist.put(batch)
+        for m in members:
+            await self.fetch.put((batch, m))
+
+    async def run(self, clubs: list[dict], *, member_filter=None) -> list:
+        """
+        Runs one poll cycle over `clubs` and returns, for every club,
+        None or the exception that stopped it.
+
+        Parameters
+        ----------
+        clubs: `list[dict]`
+            rows returned by `database.get_clubs`
+        member_filter: `Callable[[dict], bool]`
+            members it returns False for are not fetched this cycle
+        """
+        start = monotonic()
+        for stage in self.stages:
+            stage.reset()
+        workers = [
+            asyncio.create_task(stage._work(self.error), name=f"{stage.name}-{i}")
+            for stage in self.stages
+            for i in range(stage.workers)
+        ]
+        batches = [ClubBatch(c) for c in clubs]
+        try:
+            feeders = await asyncio.gather(
+                *(self._feed(b, member_filter) for b in batches),
+                return_exceptions=True,
+            )
+            for b, e in zip(batches, feeders):
+                if isinstance(e, Exception):
+                    print(
+                        f"Could not fetch the members of club {b.club['clubtag']!r}: "
+                        f"{e!r}",
+                        file=sys.stderr,
+                    )
+                    b.finish(e)
+            results = await asyncio.gather(
+                *(b.done for b in batches), return_exceptions=True
+            )
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        self.duration = monotonic() - start
+        self.report()
+        return results
+
+    def error(self, stage: Stage, item, exception: Exception) -> None:
+        """Error handler, can be overridden by subclassing."""
+        if stage in (self.fetch, self.classify):
+            club = item[0].club
+        else:
+            club = item.club
+        print(
+            f"Error in stage {stage.name!r} for club {club['clubtag']!r}.",
+            file=sys.stderr,
+        )
+        traceback.print_exception(
+            type(exception),
+            exception,
+            exception.__traceback__,
+            file=sys.stderr,
+        )
+
+    def report(self):
+        print(
+            f"poll cycle took {self.duration:.1f}s | "
+            + " | ".join(
+                "{}: {processed} ok {failed} failed {busy}s busy "
+                "{utilisation:.0%} used peak queue {peak_queue}".format(name, **stats)
+                for name, stats in self.stats().items()
+            )
+        )
+
+    def stats(self) -> dict[str, dict]:
+        return {stage.name: stage.stats(self.duration) for stage in self.stages}
@@ -0,0 +1,79 @@
+from disnake import ChannelType
+from time import monotonic
+from typing import Optional
+
+
+class EditTracker:
+    __slots__ = ("refresh", "_last")
+
+    def __init__(self, *, refresh: Optional[float] = None) -> None:
+        """
+        Remembers a fingerprint of the stats last rendered for every
+        club, so discord messages are only edited when they changed.
+
+        Parameters
+        ----------
+        refresh: `float`
+            seconds after which an unchanged message is edited anyway
+            to bump its "last updated" timestamp. Never if None (default)
+        """
+        self.refresh = refresh
+        self._last: dict[str, tuple[int, float]] = {}
+
+    @staticmethod
+    def fingerprint(description: str, trophy: int, members: int) -> int:
+        return hash((description, trophy, members))
+
+    def needs_edit(self, clubtag: str, fingerprint: int) -> bool:
+        last = self._last.get(clubtag)
+        if last is None or last[0] != fingerprint:
+            return True
+        return self.refresh is not None and monotonic() - last[1] >= self.refresh
+
+    def edited(self, clubtag: str, fingerprint: int):
+        self._last[clubtag] = (fingerprint, monotonic())
+
+    def forget(self, clubtag: str):
+        """makes the next render of `clubtag` edit its messages"""
+        self._last.pop(clubtag, None)
+
+
+class MessageCache:
+    __slots__ = ("bot", "_messages")
+
+    def __init__(self, bot) -> None:
+        """
+        Handles of the messages the club stats are rendered in, keyed
+        by (serverid, channelid, messageid). Handles are partial
+        messages, so editing them needs no prior fetch.
+
+        Parameters
+        ----------
+        bot: `disnake.Client`
+            client used to create the partial messages
+        """
+        self.bot = bot
+        self._messages: dict[tuple[int, int, int], object] = {}
+
+    def get(self, serverid: int, channelid: int, messageid: int):
+        key = (serverid, channelid, messageid)
+        message = self._messages.get(key)
+        if message is None:
+            # the gateway cache has the real channel, otherwise
+            # a text channel is assumed as set_cl_log registers those
+            channel = self.bot.get_channel(
+                channelid
+            ) or self.bot.get_partial_messageable(channelid, type=ChannelType.text)
+            message = channel.get_partial_message(messageid)
+            self._messages[key] = message
+        return message
+
+    def add(self, serverid: int, message):
+        """caches a message that was just sent"""
+        self._messages[(serverid, message.channel.id, message.id)] = message
+
+    def invalidate(self, serverid: int):
+        """drops every handle of a server, e.g. after a NotFound
+        or Forbidden or when its registration changes"""
+        for key in [k for k in self._messages if k[0] == serverid]:
+            del self._messages[key]
@@ -0,0 +1,191 @@
+import asyncio
+from brawlstars import BrawlStarsClient
+from database import (
+    get_club_members,
+    insert_club_members,
+    remove_club_members,
+    rename_club_members,
+    reset_club,
+)
+from leaderboard import ClubStats
+from time import monotonic
+
+
+class RosterCache:
+    __slots__ = (
+        "client",
+        "ttl",
+        "_clubs",
+        "_members",
+        "_stats",
+        "_refreshed",
+        "_locks",
+        "_left",
+    )
+
+    def __init__(self, client: BrawlStarsClient, *, ttl: float = 1800) -> None:
+        """
+        The club_members rows of every club, shared by the poll cycle,
+        the stats messages and the weekly reset.
+
+        Every `ttl` seconds a club's roster is compared with the api:
+        members who joined are added and renames are applied, changing
+        only those rows in the database. Members who left are no longer
+        polled but keep their row, and with it their battles in the
+        week's export and their tickets in the totals, until `reset`.
+        In between, tickets and trophies are kept up to date with `add`.
+
+        Parameters
+        ----------
+        client: `BrawlStarsClient`
+            client used for the requests
+        ttl: `float`
+            seconds before a club's roster is compared with the api again
+        """
+        self.client = client
+        self.ttl = ttl
+        # clubtag -> playertag -> row
+        self._clubs: dict[str, dict[str, dict]] = {}
+        # playertag -> row, the same dicts as in _clubs
+        self._members: dict[str, dict] = {}
+        self._stats: dict[str, ClubStats] = {}
+        self._refreshed: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        # clubtag -> tags of the members who left since the last reset
+        self._left: dict[str, set[str]] = {}
+
+    async def get(self, clubtag: str) -> list[dict]:
+        """returns the club_members rows of the club's current
+        members, refreshed if stale"""
+        refreshed = self._refreshed.get(clubtag)
+        if refreshed is None or monotonic() - refreshed > self.ttl:
+            await self.refresh(clubtag)
+        left = self._left.get(clubtag, ())
+        return [row for tag, row in self._clubs[clubtag].items() if tag not in left]
+
+    def stats(self, clubtag: str) -> ClubStats:
+        """the club's totals and leaderboard as of its last `get`"""
+        return self._stats[clubtag]
+
+    async def _api_members(self, clubtag: str) -> list:
+        return [m async for m in await self.client.get_club_members(clubtag)]
+
+    async def _clubname(self, clubtag: str, rows: dict[str, dict]) -> str:
+        for row in rows.values():
+            return row["clubname"]
+        return (await self.client.get_club(clubtag)).name
+
+    def _moved(self, clubtag: str, tags) -> list[str]:
+        """drops `tags` from the other clubs' cached rows and returns them.
+        Members who switched clubs may still have a row elsewhere"""
+        for tag in tags:
+            row = self._members.pop(tag, None)
+            if row is not None and row["clubtag"] != clubtag:
+                other = self._clubs.get(row["clubtag"])
+                if other is not None:
+                    other.pop(tag, None)
+                    self._stats[row["clubtag"]] = ClubStats(list(other.values()))
+        return list(tags)
+
+    def _store(self, clubtag: str, rows: dict[str, dict]):
+        for tag in self._clubs.get(clubtag, {}):
+            self._members.pop(tag, None)
+        self._clubs[clubtag] = rows
+        self._members.update(rows)
+        self._stats[clubtag] = ClubStats(list(rows.values()))
+        self._refreshed[clubtag] = monotonic()
+
+    async def refresh(self, clubtag: str):
+        """syncs the club's roster with the api and the database"""
+        lock = self._locks.setdefault(clubtag, asyncio.Lock())
+        async with lock:
+            refreshed = self._refreshed.get(clubtag)
+            if refreshed is not None and monotonic() - refreshed <= self.ttl:
+                # refreshed while waiting for the lock
+                return
+            # the database is read again so rows changed elsewhere are seen
+            rows = {r["playertag"]: r for r in await get_club_members(clubtag)}
+            members = await self._api_members(clubtag)
+            tags = {m.tag for m in members}
+
+            joined = [m for m in members if m.tag not in rows]
+            # rows of members who left are only deleted by `reset`
+            left = {tag for tag in rows if tag not in tags}
+            newly_left = left - self._left.get(clubtag, set())
+            renamed = {
+                m.tag: m.name
+                for m in members
+                if m.tag in rows and rows[m.tag]["playername"] != m.name
+            }
+            if joined:
+                # joined members are removed from any club they were in before
+                await remove_club_members(self._moved(clubtag, [m.tag for m in joined]))
+                clubname = await self._clubname(clubtag, rows)
+                new = [
+                    {
+                        "playertag": m.tag,
+                        "playername": m.name,
+                        "clubname": clubname,
+                        "clubtag": clubtag,
+                        "tickets": 0,
+                        "trophy": 0,
+                    }
+                    for m in joined
+                ]
+                await insert_club_members(new)
+                rows.update((r["playertag"], r) for r in new)
+            if renamed:
+                await rename_club_members(renamed)
+                for tag, name in renamed.items():
+                    rows[tag]["playername"] = name
+            if joined or newly_left or renamed:
+                print(
+                    f"{clubtag}: {len(joined)} joined, {len(newly_left)} left, "
+                    f"{len(renamed)} renamed"
+                )
+            self._left[clubtag] = left
+            self._store(clubtag, rows)
+
+    def add(self, increments: list[tuple[str, int, int]]):
+        """applies (playertag, tickets, trophychange) increments that
+        were written to the database to the cached rows"""
+        for tag, tickets, trophychange in increments:
+            row = self._members.get(tag)
+            if row is not None:
+                row["tickets"] += tickets
+                row["trophy"] += trophychange
+                self._stats[row["clubtag"]].update(row, tickets, trophychange)
+
+    async def reset(self, clubtag: str):
+        """starts a new week: the club's members are
+        replaced by its current ones with no tickets or trophies"""
+        lock = self._locks.setdefault(clubtag, asyncio.Lock())
+        async with lock:
+            members = await self._api_members(clubtag)
+            club = await self.client.get_club(clubtag)
+            current = self._clubs.get(clubtag, {})
+            await remove_club_members(
+                self._moved(clubtag, [m.tag for m in members if m.tag not in current])
+            )
+            rows = {
+                m.tag: {
+                    "playertag": m.tag,
+                    "playername": m.name,
+                    "clubname": club.name,
+                    "clubtag": clubtag,
+                    "tickets": 0,
+                    "trophy": 0,
+                }
+                for m in members
+            }
+            await reset_club(clubtag, list(rows.values()))
+            self._left.pop(clubtag, None)
+            self._store(clubtag, rows)
+
+    def forget(self, clubtag: str):
+        """drops a club, e.g. once it isn't tracked anymore"""
+        for tag in self._clubs.pop(clubtag, {}):
+            self._members.pop(tag, None)
+        self._stats.pop(clubtag, None)
+        self._refreshed.pop(clubtag, None)
+        self._left.pop(clubtag, None)
@@ -0,0 +1,90 @@
+import os
+import socket
+from aiohttp import ClientSession
+from typing import Optional
+from zlib import crc32
+
+
+def shard_of(clubtag: str, shard_count: int) -> int:
+    """returns the shard a club belongs to. The hash is stable across
+    processes and hosts, unlike the builtin `hash` of a str."""
+    return crc32(clubtag.upper().encode()) % shard_count
+
+
+class Shard:
+    __slots__ = ("id", "count", "coordinator", "worker")
+
+    def __init__(
+        self,
+        id: int = 0,
+        count: int = 1,
+        *,
+        coordinator: Optional[str] = None,
+        worker: Optional[str] = None,
+    ) -> None:
+        """
+        The part of the tracked clubs this process is responsible for.
+
+        Parameters
+        ----------
+        id: `int`
+            this shard's id (0 ~ count-1)
+        count: `int`
+            total number of shards
+        coordinator: `str`
+            url of the coordinator that assigns the shard and
+            collects its health, if the shard is not fixed
+        worker: `str`
+            name this process registers with, defaults to host:pid
+        """
+        if not 0 <= id < count:
+            raise ValueError("shard id must be between 0 and count-1")
+        self.id = id
+        self.count = count
+        self.coordinator = coordinator
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+
+    def __repr__(self) -> str:
+        return f"Shard(id={self.id}, count={self.count}, worker={self.worker!r})"
+
+    @classmethod
+    async def from_env(cls) -> "Shard":
+        """Creates the shard from COORDINATOR_URL, or the fixed
+        SHARD_ID and SHARD_COUNT. Not sharded if none are set."""
+        coordinator = os.getenv("COORDINATOR_URL")
+        if coordinator:
+            shard = cls(coordinator=coordinator.rstrip("/"))
+            await shard.register()
+            return shard
+        return cls(int(os.getenv("SHARD_ID", 0)), int(os.getenv("SHARD_COUNT", 1)))
+
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1 or self.coordinator is not None
+
+    def owns(self, clubtag: str) -> bool:
+        return self.count == 1 or shard_of(clubtag, self.count) == self.id
+
+    async def _post(self, endpoint: str, payload: dict) -> tuple[int, dict]:
+        async with ClientSession() as session:
+            async with session.post(self.coordinator + endpoint, json=payload) as r:
+                return r.status, await r.json(content_type=None)
+
+    async def register(self):
+        """asks the coordinator for a shard"""
+        status, data = await self._post("/register", {"worker": self.worker})
+        if status != 200:
+            raise RuntimeError(f"coordinator refused {self.worker}: {data}")
+        self.id, self.count = data["shard_id"], data["shard_count"]
+        print(f"registered as shard {self.id}/{self.count}")
+
+    async def heartbeat(self, **stats):
+        """reports this shard's health to the coordinator. Registers
+        again if the shard was handed to another worker meanwhile."""
+        if self.coordinator is None:
+            return
+        status, _ = await self._post(
+            "/heartbeat", {"worker": self.worker, "shard_id": self.id, **stats}
+        )
+        if status == 409:
+            await self.register()
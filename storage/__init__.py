@@ -0,0 +1,23 @@
+"""
+Storage backends for the tracker's tables and rpcs
+"""
+
+import os
+from .base import Storage
+from .sqlite_backend import SQLiteStorage
+
+
+def create_storage(backend: str = None) -> Storage:
+    """Creates the backend named by `backend` or the STORAGE_BACKEND
+    environment variable: "supabase" (default) or "sqlite"."""
+    backend = (backend or os.getenv("STORAGE_BACKEND") or "supabase").lower()
+    match backend:
+        case "supabase":
+            # imported here so sqlite-only deployments don't need supabase
+            from .supabase_backend import SupabaseStorage
+
+            return SupabaseStorage(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        case "sqlite":
+            return SQLiteStorage(os.getenv("SQLITE_PATH", "tracker.db"))
+        case _:
+            raise ValueError(f"unknown storage backend '{backend}'")
@@ -0,0 +1,99 @@
+from abc import ABC, abstractmethod
+
+
+class Storage(ABC):
+    """Base class for the storage backends used by `database`.
+
+    Methods are synchronous and are run on the database thread pool,
+    so implementations may block, and all of them are abstract so a
+    backend missing one fails when it's created, not mid-cycle. Rows
+    are returned as lists of dicts shaped like the supabase tables:
+
+    clubs: clubtag, clubrank
+    discord: clubtag, serverid, channelid, messageid
+    club_members: playertag, playername, clubtag, clubname, tickets, trophy
+    club_league: battle_id, playertag, team, opponent, map,
+                 type, result, ticket, trophychange, time
+    """
+
+    __slots__ = ()
+
+    TABLES = ("club_league", "club_members", "clubs", "discord")
+
+    def _check_table(self, table: str):
+        if table not in self.TABLES:
+            raise ValueError(f"the table '{table}' does not exist.")
+
+    @abstractmethod
+    def exists(self, table: str, field: str, value) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def store_logs(self, rows: list[dict]) -> list[dict]:
+        """the `store_logs` rpc: in one transaction, inserts the club_league
+        `rows` whose battle_id isn't stored yet and adds their ticket and
+        trophychange to club_members. Returns the rows inserted"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_club_logs(self, clubtag: str, page_size: int = 1000):
+        """yields the club league logs of every member of a club, oldest
+        first and with the member's playername, `page_size` rows at a time"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_member_log(self, membertag: str) -> list[dict]:
+        """the `get_member_log` rpc: the club league logs of a member
+        joined with its playername, oldest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_club_members(self, clubtag: str, *fields: str) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_club_members(self, rows: list[dict]) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_club_members(self, clubtag: str) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_club_members(self, playertags: list[str]) -> list[dict]:
+        """deletes the given members, wherever their club"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def rename_club_members(self, names: dict[str, str]):
+        """sets the playername of every playertag in `names`"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_clubs(self) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_club(self, row: dict) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_discord_info(self, clubtags: list[str]) -> list[dict]:
+        """registrations of `clubtags` whose channel is still set"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_discord_info(self, row: dict) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def edit_discord_info(self, edit: dict, clubtag: str, serverid: int) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_server_logs(self, serverid: int) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_server_logs(self, serverid: int, clubtags: list[str]) -> list[dict]:
+        raise NotImplementedError
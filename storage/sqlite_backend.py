@@ -0,0 +1,234 @@
+import json
+import sqlite3
+import threading
+from .base import Storage
+
+SCHEMA = """
+create table if not exists clubs (
+    clubtag text primary key,
+    clubrank text
+);
+create table if not exists discord (
+    clubtag text not null,
+    serverid integer not null,
+    channelid integer not null default 0,
+    messageid integer not null default 0,
+    primary key (clubtag, serverid)
+);
+create index if not exists discord_serverid on discord (serverid);
+create table if not exists club_members (
+    playertag text primary key,
+    playername text,
+    clubtag text,
+    clubname text,
+    tickets integer not null default 0,
+    trophy integer not null default 0
+);
+create index if not exists club_members_clubtag on club_members (clubtag);
+create table if not exists club_league (
+    battle_id text primary key,
+    playertag text not null,
+    team text,
+    opponent text,
+    map text,
+    type text,
+    result text,
+    ticket integer,
+    trophychange integer,
+    time integer
+);
+create index if not exists club_league_playertag on club_league (playertag, time);
+"""
+
+# columns stored as json text
+_JSON_FIELDS = ("team", "opponent")
+
+
+class SQLiteStorage(Storage):
+    """Stores everything in an embedded SQLite database (WAL mode).
+    Every thread of the database pool gets its own connection."""
+
+    __slots__ = ("path", "_local")
+
+    def __init__(self, path: str = "tracker.db") -> None:
+        """
+        Parameters
+        ----------
+        path: `str`
+            database file. `file:` uris are supported, e.g.
+            "file:bench?mode=memory&cache=shared" for an in-memory
+            database shared by every connection
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, uri=self.path.startswith("file:"))
+            conn.row_factory = _row_factory
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute("pragma busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, sql: str, params=()) -> list[dict]:
+        return self._conn().execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params=(), *, many=False) -> None:
+        conn = self._conn()
+        with conn:
+            if many:
+                conn.executemany(sql, params)
+            else:
+                conn.execute(sql, params)
+
+    def _insert(self, table: str, rows: list[dict]) -> list[dict]:
+        if not rows:
+            return []
+        fields = list(rows[0])
+        self._write(
+            "insert into {} ({}) values ({})".format(
+                table, ", ".join(fields), ", ".join("?" * len(fields))
+            ),
+            [tuple(_dump(k, r[k]) for k in fields) for r in rows],
+            many=True,
+        )
+        return rows
+
+    def exists(self, table, field, value):
+        self._check_table(table)
+        return bool(
+            self._select(f"select 1 from {table} where {field} = ? limit 1", (value,))
+        )
+
+    def store_logs(self, rows):
+        if not rows:
+            return []
+        fields = list(rows[0])
+        insert = (
+            "insert into club_league ({}) values ({}) "
+            "on conflict (battle_id) do nothing"
+        ).format(", ".join(fields), ", ".join("?" * len(fields)))
+        conn = self._conn()
+        inserted = []
+        with conn:
+            for r in rows:
+                cursor = conn.execute(insert, tuple(_dump(k, r[k]) for k in fields))
+                if cursor.rowcount:
+                    inserted.append(r)
+            conn.executemany(
+                "update club_members set tickets = tickets + ?, "
+                "trophy = trophy + ? where playertag = ?",
+                [(r["ticket"], r["trophychange"], r["playertag"]) for r in inserted],
+            )
+        return inserted
+
+    def iter_club_logs(self, clubtag, page_size=1000):
+        cursor = self._conn().execute(
+            "select l.*, m.playername from club_league l "
+            "join club_members m on m.playertag = l.playertag "
+            "where m.clubtag = ? order by l.time, l.battle_id",
+            (clubtag,),
+        )
+        while page := cursor.fetchmany(page_size):
+            yield from page
+
+    def get_member_log(self, membertag):
+        return self._select(
+            "select l.*, m.playername from club_league l "
+            "join club_members m on m.playertag = l.playertag "
+            "where l.playertag = ? order by l.time",
+            (membertag,),
+        )
+
+    def get_club_members(self, clubtag, *fields):
+        return self._select(
+            "select {} from club_members where clubtag = ?".format(
+                ", ".join(fields) or "*"
+            ),
+            (clubtag,),
+        )
+
+    def insert_club_members(self, rows):
+        return self._insert("club_members", rows)
+
+    def delete_club_members(self, clubtag):
+        rows = self.get_club_members(clubtag)
+        self._write("delete from club_members where clubtag = ?", (clubtag,))
+        return rows
+
+    def remove_club_members(self, playertags):
+        removed = []
+        for i in range(0, len(playertags), 900):
+            chunk = playertags[i : i + 900]
+            query = "from club_members where playertag in ({})".format(
+                ", ".join("?" * len(chunk))
+            )
+            removed.extend(self._select("select * " + query, chunk))
+            self._write("delete " + query, chunk)
+        return removed
+
+    def rename_club_members(self, names):
+        self._write(
+            "update club_members set playername = ? where playertag = ?",
+            [(name, tag) for tag, name in names.items()],
+            many=True,
+        )
+
+    def get_clubs(self):
+        return self._select("select * from clubs")
+
+    def insert_club(self, row):
+        return self._insert("clubs", [row])
+
+    def get_discord_info(self, clubtags):
+        return self._select(
+            "select * from discord where channelid != 0 and clubtag in ({})".format(
+                ", ".join("?" * len(clubtags))
+            ),
+            clubtags,
+        )
+
+    def insert_discord_info(self, row):
+        return self._insert("discord", [row])
+
+    def edit_discord_info(self, edit, clubtag, serverid):
+        self._write(
+            "update discord set {} where clubtag = ? and serverid = ?".format(
+                ", ".join(f"{k} = ?" for k in edit)
+            ),
+            (*edit.values(), clubtag, serverid),
+        )
+        return self._select(
+            "select * from discord where clubtag = ? and serverid = ?",
+            (clubtag, serverid),
+        )
+
+    def get_server_logs(self, serverid):
+        return self._select("select * from discord where serverid = ?", (serverid,))
+
+    def remove_server_logs(self, serverid, clubtags):
+        query = "from discord where serverid = ? and clubtag in ({})".format(
+            ", ".join("?" * len(clubtags))
+        )
+        rows = self._select("select * " + query, (serverid, *clubtags))
+        self._write("delete " + query, (serverid, *clubtags))
+        return rows
+
+
+def _dump(field, value):
+    return json.dumps(value, ensure_ascii=False) if field in _JSON_FIELDS else value
+
+
+def _row_factory(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    data = {}
+    for (field, *_), value in zip(cursor.description, row):
+        if field in _JSON_FIELDS and value is not None:
+            value = json.loads(value)
+        data[field] = value
+    return data
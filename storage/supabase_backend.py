@@ -0,0 +1,143 @@
+from supabase import create_client
+from .base import Storage
+
+
+class SupabaseStorage(Storage):
+    """Stores everything in the remote supabase tables."""
+
+    __slots__ = ("client", "tables", "chunk_size")
+
+    def __init__(self, url: str, key: str, *, chunk_size: int = 200) -> None:
+        """
+        Parameters
+        ----------
+        url, key: `str`
+            supabase project url and api key
+        chunk_size: `int`
+            how many ids go in a single `in` filter,
+            to keep the request url short
+        """
+        self.client = create_client(url, key)
+        self.tables = {t: self.client.table(t) for t in self.TABLES}
+        self.chunk_size = chunk_size
+
+    def exists(self, table, field, value):
+        self._check_table(table)
+        data = self.tables[table].select(field).eq(field, value).execute()
+        return bool(data.data)
+
+    def store_logs(self, rows):
+        return self.client.rpc("store_logs", {"logs": rows}).execute().data
+
+    def iter_club_logs(self, clubtag, page_size=1000):
+        names = {
+            m["playertag"]: m["playername"]
+            for m in self.get_club_members(clubtag, "playertag", "playername")
+        }
+        if not names:
+            return
+        start = 0
+        while True:
+            page = (
+                self.tables["club_league"]
+                .select("*")
+                .in_("playertag", list(names))
+                # battle_id breaks ties between rows of the same time so
+                # pages don't overlap or skip rows; a single order
+                # param, PostgREST doesn't merge repeated ones
+                .order("time,battle_id")
+                .range(start, start + page_size - 1)
+                .execute()
+                .data
+            )
+            for row in page:
+                row["playername"] = names[row["playertag"]]
+                yield row
+            if len(page) < page_size:
+                return
+            start += page_size
+
+    def get_member_log(self, membertag):
+        return (
+            self.client.rpc("get_member_log", {"membertag": membertag}).execute().data
+        )
+
+    def get_club_members(self, clubtag, *fields):
+        return (
+            self.tables["club_members"]
+            .select(*(fields or ("*",)))
+            .eq("clubtag", clubtag)
+            .execute()
+            .data
+        )
+
+    def insert_club_members(self, rows):
+        return self.tables["club_members"].insert(rows).execute().data
+
+    def delete_club_members(self, clubtag):
+        return (
+            self.tables["club_members"].delete().eq("clubtag", clubtag).execute().data
+        )
+
+    def remove_club_members(self, playertags):
+        removed = []
+        for i in range(0, len(playertags), self.chunk_size):
+            data = (
+                self.tables["club_members"]
+                .delete()
+                .in_("playertag", playertags[i : i + self.chunk_size])
+                .execute()
+            )
+            removed.extend(data.data)
+        return removed
+
+    def rename_club_members(self, names):
+        # renames are rare, one update each is fine
+        for playertag, playername in names.items():
+            self.tables["club_members"].update({"playername": playername}).eq(
+                "playertag", playertag
+            ).execute()
+
+    def get_clubs(self):
+        return self.tables["clubs"].select("*").execute().data
+
+    def insert_club(self, row):
+        return self.tables["clubs"].insert(row).execute().data
+
+    def get_discord_info(self, clubtags):
+        return (
+            self.tables["discord"]
+            .select("*")
+            .neq("channelid", 0)
+            .in_("clubtag", clubtags)
+            .execute()
+            .data
+        )
+
+    def insert_discord_info(self, row):
+        return self.tables["discord"].insert(row).execute().data
+
+    def edit_discord_info(self, edit, clubtag, serverid):
+        return (
+            self.tables["discord"]
+            .update(edit)
+            .eq("clubtag", clubtag)
+            .eq("serverid", serverid)
+            .execute()
+            .data
+        )
+
+    def get_server_logs(self, serverid):
+        return (
+            self.tables["discord"].select("*").eq("serverid", serverid).execute().data
+        )
+
+    def remove_server_logs(self, serverid, clubtags):
+        return (
+            self.tables["discord"]
+            .delete()
+            .eq("serverid", serverid)
+            .in_("clubtag", clubtags)
+            .execute()
+            .data
+        )
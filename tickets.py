@@ -0,0 +1,57 @@
+from datetime import datetime
+
+# tickets handed out on each club league day, by weekday
+CL_DAY_TICKETS = {2: 4, 4: 4, 6: 6}
+# and in the whole week up to the end of each club league day
+CL_WEEK_TICKETS = {2: 4, 4: 8, 6: 14}
+
+
+class TicketTracker:
+    __slots__ = ("idle_every", "_weekday", "_cycle")
+
+    def __init__(self, *, idle_every: int = 3) -> None:
+        """
+        Decides whose battle log is worth fetching from the weekly
+        tickets of their club_members row.
+
+        Unused tickets don't carry over to the next day, so a member
+        with as many tickets as the week has handed out so far used
+        all of today's and isn't polled until the next day starts.
+        Members with no more than the earlier days' tickets may not
+        have played today and are only polled every `idle_every` cycles.
+
+        Parameters
+        ----------
+        idle_every: `int`
+            polling period, in cycles, of members who may not have played today
+        """
+        if idle_every < 1:
+            raise ValueError("idle_every must be at least 1")
+        self.idle_every = idle_every
+        self._weekday: int = None
+        self._cycle = 0
+
+    def new_cycle(self, now: datetime):
+        """to be called at the start of every cycle with the
+        current time in the club league timezone"""
+        self._cycle += 1
+        self._weekday = now.weekday()
+
+    def used_today(self, member: dict) -> int | None:
+        """the tickets `member` (a club_members row) used today, at least.
+        Exact unless they left tickets of earlier days unused"""
+        total = CL_WEEK_TICKETS.get(self._weekday)
+        if total is None:
+            return None
+        return max(member["tickets"] - (total - CL_DAY_TICKETS[self._weekday]), 0)
+
+    def should_poll(self, member: dict) -> bool:
+        """whether to fetch the battle log of `member`, a club_members row"""
+        total = CL_WEEK_TICKETS.get(self._weekday)
+        if total is None:
+            return True
+        if member["tickets"] >= total:
+            return False
+        if self.used_today(member) == 0:
+            return self._cycle % self.idle_every == 0
+        return True
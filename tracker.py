@@ -0,0 +1,108 @@
+from datetime import datetime, time, timezone, timedelta
+from brawlstars import Battle, codec
+from brawlstars.models.utils import format_battleTime, parse_battleTime
+from database import (
+    store_logs,
+    create_battle_id,
+)
+from watermark import Watermarks
+from roster import RosterCache
+from classifier import BattleClassifier
+from history import BattleHistory
+from metrics import BATTLES
+
+# Brawl Stars Club League begins and ends at 00:00 UTC-9
+# but we give some leniency for first and last updates
+# because some people do club league at last minutes
+BS_TIMEZONE = timezone(timedelta(hours=-9, minutes=-5))
+
+
+class ClubLeagueTracker:
+    __slots__ = ("watermarks", "roster", "classifier", "history")
+
+    def __init__(
+        self,
+        watermarks: Watermarks,
+        roster: RosterCache,
+        *,
+        classifier: BattleClassifier = None,
+        history: BattleHistory = None,
+    ) -> None:
+        """
+        Picks the club league battles out of battle logs and stores them.
+
+        Parameters
+        ----------
+        watermarks: `Watermarks`
+            newest processed battle of every player
+        roster: `RosterCache`
+            cached club_members rows, kept in step with the stored battles
+        classifier: `BattleClassifier`
+            tells club league battles apart, with the default rules if None
+        history: `BattleHistory`
+            keeps the stored battles in memory too, if given
+        """
+        self.watermarks = watermarks
+        self.roster = roster
+        self.classifier = classifier or BattleClassifier()
+        self.history = history
+
+    async def check_logs(self, member: dict, logs: list[dict]):
+        """returns (playertag, newest battleTime, battles) where battles are
+        the club league battles of today in `logs` as (playertag, battle, tickets).
+        `logs` are raw battle log entries, newest first, so reading stops at
+        the first one that was already processed or that was not played today.
+        Only the entries that may be club league battles become `Battle`s."""
+        tag = member["playertag"]
+        mark = self.watermarks.get(tag)
+        # battleTime strings compare like the times they hold
+        after = format_battleTime(datetime.fromtimestamp(mark, timezone.utc))
+        today = format_battleTime(
+            datetime.combine(datetime.now(tz=BS_TIMEZONE).date(), time(), BS_TIMEZONE)
+        )
+        page = []
+        for entry in logs:
+            battletime = entry["battleTime"]
+            if battletime <= after or battletime < today:
+                break
+            page.append(entry)
+        if not page:
+            return tag, mark, []
+
+        newest = round(parse_battleTime(max(e["battleTime"] for e in page)).timestamp())
+        battles = [
+            (tag, l, rule.tickets)
+            for l, rule in self.classifier.classify_page(
+                codec.build(Battle, e) for e in page if self.classifier.may_match(e)
+            )
+        ]
+        return tag, max(mark, newest), battles
+
+    async def store_logs(self, battles):
+        """stores the battles that are not in the database yet and
+        their tickets and trophies with a single transactional rpc"""
+        if not battles:
+            return
+        inserted = {r["battle_id"] for r in await store_logs(battles)}
+        stored = []
+        for b in battles:
+            battle_id = create_battle_id(b[0], b[1].battleTime)
+            if battle_id in inserted:
+                # a battle in the batch twice is only inserted once
+                inserted.discard(battle_id)
+                stored.append(b)
+        battles = stored
+        BATTLES.inc(len(battles))
+        if self.history is not None:
+            for tag, l, tickets in battles:
+                self.history.add(tag, l, tickets)
+        self.roster.add(
+            [(tag, tickets, l.trophyChange) for tag, l, tickets in battles]
+        )
+
+    async def persist(self, club: dict, results: list):
+        """stores the battles found in a club's logs by `check_logs`"""
+        await self.store_logs([b for _, _, battles in results for b in battles])
+        # only moved once the battles are stored so failures are retried
+        for tag, newest, _ in results:
+            self.watermarks.advance(tag, newest)
@@ -52,14 +52,15 @@ def format_battle_log(battle: Battle):
     return fmt
 
 
+def format_member_line(m: dict) -> str:
+    return "{:2d}/14🎟️ {:2d} 🏆|`{}`\n".format(
+        m["tickets"], m["trophy"], m["playername"]
+    )
+
+
 def format_member_stats(members: list[dict]) -> tuple[str, int]:
-    string = ""
-    trophy = 0
-    for m in members:
-        string += "{:2d}/14🎟️ {:2d} 🏆|`{}`\n".format(
-            m["tickets"], m["trophy"], m["playername"]
-        )
-        trophy += m["trophy"]
+    string = "".join(format_member_line(m) for m in members)
+    trophy = sum(m["trophy"] for m in members)
     return string, trophy
 
 
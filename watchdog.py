@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+import threading
+import traceback
+from time import monotonic, sleep
+from metrics import LOOP_LAG, LOOP_BLOCKS, LOOP_BLOCKED_SECONDS
+
+# frames from files under this directory are the tracker's own code
+_SELF = os.path.abspath(__file__)
+_ROOT = os.path.dirname(_SELF)
+
+
+def _task_stack(stack: list[traceback.FrameSummary]) -> list:
+    """drops the event loop's own frames, leaving the running callback"""
+    asyncio_dir = os.path.dirname(asyncio.__file__)
+    start = max(
+        (i + 1 for i, f in enumerate(stack) if f.filename.startswith(asyncio_dir)),
+        default=0,
+    )
+    return stack[start:] or stack
+
+
+def _own(frame: traceback.FrameSummary) -> bool:
+    return (
+        frame.filename.startswith(_ROOT)
+        and "site-packages" not in frame.filename
+        and frame.filename != _SELF
+    )
+
+
+class LoopWatchdog:
+    __slots__ = (
+        "loop",
+        "interval",
+        "threshold",
+        "_beat",
+        "_stall",
+        "_thread_id",
+        "_task",
+        "_running",
+    )
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop = None,
+        *,
+        interval: float = 0.05,
+        threshold: float = 0.25,
+    ) -> None:
+        """
+        Measures how late the event loop runs a task that sleeps
+        `interval` seconds. A thread checks on the task, and when the
+        loop is stuck for more than `threshold` seconds it takes a stack
+        sample of the loop's thread to find the blocking call.
+
+        Parameters
+        ----------
+        loop: `asyncio.AbstractEventLoop`
+            loop to watch, the current one if None
+        interval: `float`
+            seconds between two measurements
+        threshold: `float`
+            lag, in seconds, from which the loop counts as blocked
+        """
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self._beat: float = None
+        # (beat, stack) sampled during the stall that followed `beat`
+        self._stall: tuple[float, list] = None
+        self._thread_id: int = None
+        self._task: asyncio.Task = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        loop = self.loop or asyncio.get_event_loop()
+        self._task = loop.create_task(self._tick())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _tick(self):
+        self._thread_id = threading.get_ident()
+        while True:
+            beat = self._beat = monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(monotonic() - beat - self.interval, 0.0)
+            LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                stall = self._stall
+                self.blocked(lag, stall[1] if stall and stall[0] == beat else [])
+
+    def _watch(self):
+        while self._running:
+            sleep(self.interval)
+            beat = self._beat
+            if beat is None or (self._stall is not None and self._stall[0] == beat):
+                continue
+            if monotonic() - beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None and self._beat == beat:
+                # still the same stall, so the sample shows what blocks it
+                self._stall = (beat, traceback.extract_stack(frame))
+            del frame
+
+    @staticmethod
+    def attribute(stack: list[traceback.FrameSummary]) -> tuple[str, str]:
+        """returns the innermost function of the tracker's own code
+        in `stack` and the function that called it"""
+        own = [f for f in _task_stack(stack) if _own(f)]
+        if not own:
+            return (stack[-1].name if stack else "unknown"), ""
+        return own[-1].name, own[-2].name if len(own) > 1 else ""
+
+    def blocked(self, lag: float, stack: list[traceback.FrameSummary]) -> None:
+        """Called when the loop was blocked for `lag` seconds with
+        the stack sampled meanwhile (empty if the stall ended before
+        a sample was taken). Can be overridden by subclassing."""
+        function, caller = self.attribute(stack)
+        LOOP_BLOCKS.inc(function=function, caller=caller)
+        LOOP_BLOCKED_SECONDS.inc(lag, function=function)
+        where = f"{function} (called from {caller})" if caller else function
+        print(f"event loop was blocked for {lag:.2f}s in {where}", file=sys.stderr)
+        traceback.print_list(_task_stack(stack), file=sys.stderr)
@@ -0,0 +1,48 @@
+import json
+import os
+
+
+class Watermarks:
+    __slots__ = ("path", "_marks", "_dirty")
+
+    def __init__(self, path: str = "watermarks.json") -> None:
+        """
+        The newest processed battleTime (unix seconds) of every player,
+        kept in memory and persisted to `path` so restarts don't
+        re-examine old battles.
+
+        Parameters
+        ----------
+        path: `str`
+            json file the watermarks are loaded from and saved to
+        """
+        self.path = path
+        self._marks: dict[str, int] = {}
+        self._dirty = False
+        try:
+            with open(path, encoding="utf8") as f:
+                self._marks = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            print(f"ignoring corrupted watermark file {path!r}")
+
+    def get(self, playertag: str) -> int:
+        """returns the newest processed battleTime of a player, or 0"""
+        return self._marks.get(playertag, 0)
+
+    def advance(self, playertag: str, battletime: int):
+        """moves a player's watermark forward; older times are ignored"""
+        if battletime > self._marks.get(playertag, 0):
+            self._marks[playertag] = battletime
+            self._dirty = True
+
+    def save(self):
+        """writes the watermarks to disk if any of them changed"""
+        if not self._dirty:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf8") as f:
+            json.dump(self._marks, f)
+        os.replace(tmp, self.path)
+        self._dirty = False